@@ -47,12 +47,13 @@ def demo_pipeline():
         print("\n🎯 Running demo queries...")
         print("=" * 55)
         
-        for i, query in enumerate(demo_queries, 1):
+        # All queries are embedded and scored in one batch
+        batch_results = retriever.search_similar_chunks_batch(demo_queries, top_k=2)
+        
+        for i, (query, results) in enumerate(zip(demo_queries, batch_results), 1):
             print(f"\n📋 Query {i}: {query}")
             print("-" * 40)
             
-            results = retriever.search_similar_chunks(query, top_k=2)
-            
             if results:
                 for j, result in enumerate(results, 1):
                     print(f"\n  Result {j} (similarity: {result['similarity']:.3f})")
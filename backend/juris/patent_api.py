@@ -5,21 +5,30 @@ Provides endpoints for patent similarity search using local corpus and web searc
 """
 
 import os
+import re
+import time
+import hashlib
+import heapq
+import operator
 import asyncio
 import logging
 import base64
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 from contextlib import asynccontextmanager
 
+import httpx
+import numpy as np
+import orjson
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 import anthropic
-from exa_py import Exa
+from cachetools import TTLCache
 from dotenv import load_dotenv
-import requests
 
 # Add current directory to path for imports
 import sys
@@ -35,8 +44,96 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Knowledge base loaded at startup and by /patent/reload
+PATENT_KB_PATH = Path(__file__).parent / "patent_knowledge_base.pkl"
+
+# API key availability is fixed for the lifetime of the process
+OPENAI_API_KEY_CONFIGURED = bool(os.getenv("OPENAI_API_KEY"))
+EXA_API_KEY_CONFIGURED = bool(os.getenv("EXA_API_KEY"))
+
+EXA_SEARCH_URL = "https://api.exa.ai/search"
+
+# Exa responses are cached by normalized query for a day
+EXA_CACHE_SIZE = 4096
+EXA_CACHE_TTL = 24 * 60 * 60
+QUERY_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the "
+    "this to was which with".split()
+)
+
+# Constant terms appended to every Exa query so identical descriptions
+# always produce byte-identical requests
+PATENT_QUERY_SUFFIX = " ".join(
+    ("invention", "prior art", "USPTO", "patent application filing")
+)
+
+# Concept image URLs are cached by prompt for a week; FAL uses a fixed seed,
+# so identical prompts produce identical images
+IMAGE_CACHE_SIZE = 1024
+IMAGE_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Concept image style: isometric sketch drawing on light ivory background
+IMAGE_PROMPT_STYLE = (
+    "Isometric sketch drawing, three-quarter view. Hand-drawn pencil and ink linework with clean contours, "
+    "light cross-hatching, minimal shading. Light ivory paper background (#f5f5f4) with subtle paper texture. "
+    "Blueprint-style construction hints allowed (light, unobtrusive). No photorealism, no 3D rendering. "
+    "High-resolution scan look, clean edges, aspect 1:1."
+)
+
+IMAGE_PROMPT_CONSTRAINTS = (
+    "No logos, trademarks, or readable text/labels. Avoid human faces unless essential. "
+    "Emphasize mechanism, function, and form; maintain technical clarity in the sketch."
+)
+
+# Only the subject and description vary per request; the style and
+# constraints are baked into the template once
+IMAGE_PROMPT_TEMPLATE = (
+    "Concept image of: {subject}. Description: {description} "
+    f"| Style: {IMAGE_PROMPT_STYLE} | Constraints: {IMAGE_PROMPT_CONSTRAINTS}"
+)
+
+# Common patent number patterns: US patents, US applications, European
+# patents and WIPO patents, combined for a single scan
+PATENT_NUMBER_RE = re.compile(
+    r"US\d{7,8}[AB]?\d?|US\d{4}/\d{6,7}|EP\d{7}[AB]\d|WO\d{4}/\d{6}",
+    re.IGNORECASE,
+)
+
+# FAL queue API: submit a job, poll its status, then fetch the result
+FAL_QUEUE_URL = "https://queue.fal.run"
+FAL_POLL_INTERVAL = 0.5
+FAL_TIMEOUT = 60
+
+# Top results described to the LLM by the competition summary
+COMPETITION_SUMMARY_RESULTS = 8
+
+# Local results whose best score reaches this threshold are returned without
+# waiting for web search; the full search then completes in the background
+FAST_PATH_THRESHOLD = float(os.getenv("PATENT_FAST_PATH_THRESHOLD", "0.9"))
+
+# Semantic cache for /patent/search responses
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("PATENT_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("PATENT_CACHE_SIZE", "256"))
+SEMANTIC_CACHE_TTL = float(os.getenv("PATENT_CACHE_TTL", "3600"))
+
 # Global variables for loaded models
 patent_retriever: Optional[PatentRAGRetriever] = None
+patent_status: Dict[str, Any] = {}
+
+
+def refresh_patent_status() -> None:
+    """Rebuild the cached /patent/status payload after the knowledge base changes."""
+    patent_status.update(
+        {
+            "patent_corpus_loaded": patent_retriever is not None,
+            "corpus_chunks": patent_retriever._chunk_count if patent_retriever else 0,
+            "web_search_available": EXA_API_KEY_CONFIGURED,
+            "api_keys_configured": {
+                "openai": OPENAI_API_KEY_CONFIGURED,
+                "exa": EXA_API_KEY_CONFIGURED,
+            },
+        }
+    )
 
 
 @asynccontextmanager
@@ -47,9 +144,7 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Loading patent knowledge base...")
     try:
-        current_dir = Path(__file__).parent
-        pickle_path = current_dir / "patent_knowledge_base.pkl"
-        patent_retriever = PatentRAGRetriever(str(pickle_path))
+        patent_retriever = PatentRAGRetriever(str(PATENT_KB_PATH))
         logger.info("Patent knowledge base loaded successfully")
     except FileNotFoundError:
         logger.warning(
@@ -60,10 +155,23 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error loading patent knowledge base: {e}")
         patent_retriever = None
 
+    patent_service.patent_retriever = patent_retriever
+    refresh_patent_status()
+
+    # Shared HTTP/2 connection pool for Exa and FAL
+    patent_service.http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32),
+        timeout=60,
+    )
+
     yield
 
     # Shutdown
     logger.info("Shutting down patent search API")
+    for task in list(patent_service._background_tasks):
+        task.cancel()
+    await patent_service.http_client.aclose()
 
 
 app = FastAPI(
@@ -71,6 +179,7 @@ app = FastAPI(
     description="Patent similarity search with local corpus and web search",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -82,25 +191,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize clients
-exa_client = None
-try:
-    if os.getenv("EXA_API_KEY"):
-        exa_client = Exa(api_key=os.getenv("EXA_API_KEY"))
-except Exception as e:
-    logger.warning(f"Could not initialize Exa client: {e}")
-    exa_client = None
-
 # Initialize Anthropic client (optional)
 anthropic_client = None
 try:
     if os.getenv("ANTHROPIC_API_KEY"):
-        anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        anthropic_client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY")
+        )
 except Exception as e:
     logger.warning(f"Could not initialize Anthropic client: {e}")
     anthropic_client = None
 
 
+# Cap concurrent calls per provider so request bursts queue here rather than
+# at the provider
+exa_semaphore = asyncio.Semaphore(8)
+fal_semaphore = asyncio.Semaphore(4)
+
+
 # Pydantic models
 class PatentDescription(BaseModel):
     """Patent description for similarity search."""
@@ -120,11 +228,17 @@ class PatentDescription(BaseModel):
         5, description="Maximum number of local corpus results"
     )
     max_web_results: int = Field(5, description="Maximum number of web search results")
+    rerank: bool = Field(
+        True,
+        description="Whether to rescore ANN candidates with exact cosine similarity",
+    )
 
 
 class PatentResult(BaseModel):
     """Individual patent search result."""
 
+    model_config = ConfigDict(extra="ignore", validate_assignment=False, frozen=True)
+
     title: str
     description: str
     source: str
@@ -135,6 +249,17 @@ class PatentResult(BaseModel):
     assignee: Optional[str] = None
     result_type: str  # 'local_corpus' or 'web_search'
 
+    # Ranking key with missing scores already substituted, so sorts can use
+    # operator.attrgetter instead of a Python lambda
+    _sort_score: float = PrivateAttr(0.0)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.similarity_score is not None:
+            self._sort_score = self.similarity_score
+
+
+SORT_SCORE = operator.attrgetter("_sort_score")
+
 
 class PatentSearchResponse(BaseModel):
     """Response for patent similarity search."""
@@ -151,15 +276,91 @@ class PatentSearchResponse(BaseModel):
     concept_image_prompt: Optional[str] = None
 
 
+class SemanticCache:
+    """
+    In-memory cache of search responses keyed by query embedding.
+
+    A lookup hits when a stored query with identical search parameters has
+    cosine similarity >= threshold to the new one. Entries expire after ttl
+    seconds and the least recently used entry is evicted beyond capacity.
+    """
+
+    def __init__(self, threshold: float, capacity: int, ttl: float):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        # id -> (normalized embedding, search params, created_at, response)
+        self._entries: OrderedDict = OrderedDict()
+        self._next_id = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(
+        self, vector: np.ndarray, params: Tuple
+    ) -> Optional[PatentSearchResponse]:
+        """Return the closest cached response above the threshold, if any."""
+        now = time.monotonic()
+        best_id: Optional[int] = None
+        best_score = self.threshold
+
+        for entry_id, (cached, cached_params, created_at, _) in list(
+            self._entries.items()
+        ):
+            if now - created_at > self.ttl:
+                del self._entries[entry_id]
+                continue
+            if cached_params != params:
+                continue
+            score = float(cached @ vector)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            return None
+
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][3]
+
+    async def store(
+        self, vector: np.ndarray, params: Tuple, response: PatentSearchResponse
+    ) -> None:
+        async with self._lock:
+            self._entries[self._next_id] = (vector, params, time.monotonic(), response)
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
 class PatentSearchService:
     """Service for handling patent similarity searches."""
 
     def __init__(self):
         self.patent_retriever = patent_retriever
-        self.exa_client = exa_client
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._exa_cache: TTLCache = TTLCache(maxsize=EXA_CACHE_SIZE, ttl=EXA_CACHE_TTL)
+        self._image_cache: TTLCache = TTLCache(
+            maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL
+        )
+        self.semantic_cache = SemanticCache(
+            SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL
+        )
+        # Strong references to searches completing after a fast-path response
+        self._background_tasks: Set[asyncio.Task] = set()
 
     async def get_local_similar_patents(
-        self, description: str, max_results: int = 5
+        self,
+        description: str,
+        max_results: int = 5,
+        rerank: bool = True,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[PatentResult]:
         """Search local patent corpus for similar patents."""
         if not self.patent_retriever:
@@ -169,24 +370,25 @@ class PatentSearchService:
         try:
             # Search patent corpus
             corpus_results = self.patent_retriever.search_similar_chunks(
-                description, top_k=max_results
+                description,
+                top_k=max_results,
+                rerank=rerank,
+                query_embedding=query_embedding,
             )
 
-            local_patents = []
-            for result in corpus_results:
-                local_patents.append(
-                    PatentResult(
-                        title=result["document_name"],
-                        description=result["text"][:500] + "..."
-                        if len(result["text"]) > 500
-                        else result["text"],
-                        source=result["metadata"].get("document_path", "Local corpus"),
-                        similarity_score=result["similarity"],
-                        result_type="local_corpus",
-                    )
+            # Corpus results are produced internally, so skip model validation
+            return [
+                PatentResult.model_construct(
+                    title=result["document_name"],
+                    description=result["text"][:500] + "..."
+                    if len(result["text"]) > 500
+                    else result["text"],
+                    source=result["metadata"].get("document_path", "Local corpus"),
+                    similarity_score=result["similarity"],
+                    result_type="local_corpus",
                 )
-
-            return local_patents
+                for result in corpus_results
+            ]
 
         except Exception as e:
             logger.error(f"Error searching local patent corpus: {e}")
@@ -195,9 +397,9 @@ class PatentSearchService:
     async def get_web_similar_patents(
         self, description: str, title: Optional[str] = None, max_results: int = 5
     ) -> List[PatentResult]:
-        """Search web for similar patents using Exa."""
-        if not self.exa_client:
-            logger.warning("Exa client not available - missing API key")
+        """Search web for similar patents using the Exa REST API."""
+        if not EXA_API_KEY_CONFIGURED or not self.http_client:
+            logger.warning("Exa search not available - missing API key")
             return []
 
         try:
@@ -207,159 +409,290 @@ class PatentSearchService:
                 patent_query = f'patent "{title}" {description}'
 
             # Add patent-specific search terms
-            patent_query += " invention prior art USPTO patent application filing"
-
-            search_results = self.exa_client.search_and_contents(
-                query=patent_query,
-                num_results=max_results * 2,  # Get more results to filter
-                text=True,
-                highlights=True,
-                summary=True,
-                include_domains=[
-                    "uspto.gov",
-                    "patents.google.com",
-                    "patentscope.wipo.int",
-                    "espacenet.ops.epo.org",
-                ],
-            )
+            patent_query = f"{patent_query} {PATENT_QUERY_SUFFIX}"
+
+            cache_key = self._exa_cache_key(patent_query, max_results)
+            cached = self._exa_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+            async with exa_semaphore:
+                resp = await self.http_client.post(
+                    EXA_SEARCH_URL,
+                    headers={"x-api-key": os.getenv("EXA_API_KEY")},
+                    json={
+                        "query": patent_query,
+                        "numResults": max_results * 2,  # Get more results to filter
+                        "includeDomains": [
+                            "uspto.gov",
+                            "patents.google.com",
+                            "patentscope.wipo.int",
+                            "espacenet.ops.epo.org",
+                        ],
+                        "contents": {
+                            "text": True,
+                            "highlights": True,
+                            "summary": True,
+                        },
+                    },
+                )
+            resp.raise_for_status()
+            search_results = resp.json().get("results", [])
 
             web_patents = []
-            for result in search_results.results:
+            for result in search_results:
+                if len(web_patents) >= max_results:
+                    break
+
                 # Extract patent information
                 content = ""
-                if hasattr(result, "highlights") and result.highlights:
-                    content = " ".join(result.highlights)
-                elif hasattr(result, "summary") and result.summary:
-                    content = result.summary
-                elif hasattr(result, "text") and result.text:
-                    content = result.text[:500]
+                if result.get("highlights"):
+                    content = " ".join(result["highlights"])
+                elif result.get("summary"):
+                    content = result["summary"]
+                elif result.get("text"):
+                    content = result["text"][:500]
+
+                title = result.get("title") or ""
+                url = result.get("url") or ""
+                score = result.get("score")
 
                 # Try to extract patent number from title or URL
-                patent_number = self._extract_patent_number(result.title, result.url)
+                patent_number = self._extract_patent_number(title, url)
 
+                # Fields are coerced above, so skip model validation
                 web_patents.append(
-                    PatentResult(
-                        title=result.title,
+                    PatentResult.model_construct(
+                        title=title,
                         description=content,
-                        source=result.url,
-                        similarity_score=result.score
-                        if hasattr(result, "score")
-                        else None,
+                        source=url,
+                        similarity_score=float(score) if score is not None else None,
                         patent_number=patent_number,
                         result_type="web_search",
                     )
                 )
 
-            # Limit to requested number of results
-            return web_patents[:max_results]
+            self._exa_cache[cache_key] = tuple(web_patents)
+            return web_patents
 
         except Exception as e:
             logger.error(f"Error searching web for patents: {e}")
             return []
 
-    def _extract_patent_number(self, title: str, url: str) -> Optional[str]:
-        """Extract patent number from title or URL."""
-        import re
+    @staticmethod
+    def _exa_cache_key(patent_query: str, max_results: int) -> bytes:
+        """Hash the lowercased, stopword-stripped query with the result count."""
+        words = [w for w in patent_query.lower().split() if w not in QUERY_STOPWORDS]
+        normalized = f"{' '.join(words)}|{max_results}"
+        return hashlib.sha1(normalized.encode()).digest()
 
-        # Common patent number patterns
-        patterns = [
-            r"US\d{7,8}[AB]?\d?",  # US patents
-            r"US\d{4}/\d{6,7}",  # US applications
-            r"EP\d{7}[AB]\d",  # European patents
-            r"WO\d{4}/\d{6}",  # WIPO patents
-        ]
+    @staticmethod
+    def normalize_query(description: str) -> str:
+        """Collapse whitespace and case so equivalent descriptions share work."""
+        return " ".join(description.split()).lower()
 
-        text_to_search = f"{title} {url}"
-
-        for pattern in patterns:
-            match = re.search(pattern, text_to_search, re.IGNORECASE)
-            if match:
-                return match.group(0)
-
-        return None
+    def _extract_patent_number(self, title: str, url: str) -> Optional[str]:
+        """Extract patent number from title or URL."""
+        match = PATENT_NUMBER_RE.search(f"{title} {url}")
+        return match.group(0) if match else None
 
     async def search_similar_patents(
-        self, patent_desc: PatentDescription
+        self,
+        patent_desc: PatentDescription,
+        on_results: Optional[Callable[[List[PatentResult]], None]] = None,
     ) -> PatentSearchResponse:
-        """Search for similar patents using both local corpus and web search in parallel."""
+        """
+        Search for similar patents using both local corpus and web search in parallel.
+
+        on_results, if given, is called with the local results as soon as they are
+        ranked and again with the web results when they arrive, before the summary
+        and concept image are generated. It is not called on a semantic cache hit.
+        """
         logger.info(
             f"Searching for patents similar to: {patent_desc.description[:100]}..."
         )
 
-        # Prepare parallel searches
-        async def _noop_list() -> List[PatentResult]:
-            return []
+        # Normalize once; the embedding and both search paths share this text
+        query_text = self.normalize_query(patent_desc.description)
 
-        local_task = (
-            self.get_local_similar_patents(
-                patent_desc.description,
+        # Probe the semantic cache with the query embedding
+        query_embedding: Optional[List[float]] = None
+        cache_vector: Optional[np.ndarray] = None
+        cache_params = tuple(
+            sorted(patent_desc.model_dump(exclude={"description"}).items())
+        )
+        if self.patent_retriever:
+            try:
+                # A blocking OpenAI call (or cache read); keep it off the event loop
+                query_embedding = await asyncio.to_thread(
+                    self.patent_retriever.generate_query_embedding, query_text
+                )
+                cache_vector = SemanticCache.normalize(query_embedding)
+                cached = self.semantic_cache.lookup(cache_vector, cache_params)
+                if cached is not None:
+                    logger.info("Semantic cache hit for patent search")
+                    return cached.model_copy(
+                        update={"query_description": patent_desc.description}
+                    )
+            except Exception as e:
+                logger.warning(f"Semantic cache unavailable: {e}")
+
+        # The local search runs in-process and finishes long before the web
+        # search, so it goes first and decides whether the fast path applies
+        local_results = (
+            await self.get_local_similar_patents(
+                query_text,
                 max_results=patent_desc.max_local_results,
+                rerank=patent_desc.rerank,
+                query_embedding=query_embedding,
             )
             if patent_desc.use_local_corpus
-            else _noop_list()
+            else []
         )
-
-        web_task = (
-            self.get_web_similar_patents(
-                patent_desc.description,
-                patent_desc.title,
-                max_results=patent_desc.max_web_results,
+        if on_results is not None:
+            on_results(local_results)
+
+        # Streaming callers already have the local results, so the fast path
+        # would only cut off the web results
+        if (
+            on_results is None
+            and patent_desc.use_web_search
+            and local_results
+            and len(local_results) >= patent_desc.max_local_results
+            and SORT_SCORE(local_results[0]) >= FAST_PATH_THRESHOLD
+        ):
+            # Answer from the local corpus now and let the full search finish in
+            # the background so the next similar query hits the semantic cache
+            logger.info("High-confidence local results; returning fast path")
+            task = asyncio.create_task(
+                self._complete_search(
+                    patent_desc, query_text, local_results, cache_vector, cache_params
+                )
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return PatentSearchResponse(
+                query_description=patent_desc.description,
+                similar_patents=local_results,
+                local_results_count=len(local_results),
+                web_results_count=0,
+                total_results=len(local_results),
+                search_summary=(
+                    f"Found {len(local_results)} high-confidence matches in local "
+                    "corpus; web search is still running"
+                ),
             )
-            if patent_desc.use_web_search
-            else _noop_list()
-        )
-
-        # Execute searches in parallel
-        local_results, web_results = await asyncio.gather(local_task, web_task)
-
-        # Combine and sort results
-        all_results = local_results + web_results
 
-        # Sort by similarity score (higher first), handling None values
-        all_results.sort(
-            key=lambda x: x.similarity_score if x.similarity_score is not None else 0.0,
-            reverse=True,
+        return await self._complete_search(
+            patent_desc,
+            query_text,
+            local_results,
+            cache_vector,
+            cache_params,
+            on_results,
         )
 
-        # Create summary
-        local_count = len(local_results)
-        web_count = len(web_results)
-        search_summary = f"Found {local_count} similar patents in local corpus and {web_count} from web search"
+    async def _complete_search(
+        self,
+        patent_desc: PatentDescription,
+        query_text: str,
+        local_results: List[PatentResult],
+        cache_vector: Optional[np.ndarray],
+        cache_params: Tuple,
+        on_results: Optional[Callable[[List[PatentResult]], None]] = None,
+    ) -> PatentSearchResponse:
+        """Run the web search and post-processing on top of the local results."""
 
-        # Post-processing: generate competition summary and concept image concurrently
-        competition_summary: Optional[str] = None
-        concept_image_url: Optional[str] = None
-        concept_image_prompt: Optional[str] = None
+        async def _noop_list() -> List[PatentResult]:
+            return []
 
-        async def _gen_competition_summary() -> Optional[str]:
+        async def _gen_competition_summary(
+            results: List[PatentResult],
+        ) -> Optional[str]:
             try:
                 return await self.generate_competition_summary(
-                    query_description=patent_desc.description, results=all_results
+                    query_description=patent_desc.description, results=results
                 )
             except Exception as e:
                 logger.warning(f"Competition summary unavailable: {e}")
                 return None
 
-        async def _gen_concept_image() -> Tuple[Optional[str], Optional[str]]:
+        async def _gen_concept_image(
+            results: List[PatentResult],
+        ) -> Tuple[Optional[str], Optional[str]]:
             try:
-                prompt = self.build_image_prompt(patent_desc, all_results)
-                url = await self.generate_concept_image(prompt)
+                prompt = self.build_image_prompt(patent_desc, results)
+                cache_key = hashlib.sha256(prompt.encode()).hexdigest()
+                url = self._image_cache.get(cache_key)
+                if url is None:
+                    url = await self.generate_concept_image(prompt)
+                    if url:
+                        self._image_cache[cache_key] = url
                 return url, prompt
             except Exception as e:
                 logger.warning(f"Concept image generation failed: {e}")
                 return None, None
 
-        try:
-            summary_task = asyncio.create_task(_gen_competition_summary())
-            image_task = asyncio.create_task(_gen_concept_image())
-            (
-                competition_summary,
-                (concept_image_url, concept_image_prompt),
-            ) = await asyncio.gather(summary_task, image_task)
-        except Exception as e:
-            logger.warning(f"Post-processing tasks failed: {e}")
+        # The task group cancels every in-flight search and post-processing
+        # call if the request is cancelled or one of them fails
+        async with asyncio.TaskGroup() as tg:
+            web_task = tg.create_task(
+                self.get_web_similar_patents(
+                    query_text,
+                    patent_desc.title,
+                    max_results=patent_desc.max_web_results,
+                )
+                if patent_desc.use_web_search
+                else _noop_list()
+            )
+
+            # Local results are already in; yield once so a cached web search
+            # can complete, otherwise start the competition summary on the local
+            # results while the web search is still running
+            await asyncio.sleep(0)
+            summary_task: Optional[asyncio.Task] = None
+            speculative_top: List[PatentResult] = []
+            if local_results and not web_task.done():
+                speculative_top = sorted(local_results, key=SORT_SCORE, reverse=True)[
+                    :COMPETITION_SUMMARY_RESULTS
+                ]
+                summary_task = tg.create_task(_gen_competition_summary(speculative_top))
+
+            web_results = await web_task
+            if on_results is not None:
+                on_results(web_results)
+
+            # Combine and rank by similarity score (higher first)
+            all_results = heapq.nlargest(
+                patent_desc.max_local_results + patent_desc.max_web_results,
+                local_results + web_results,
+                key=SORT_SCORE,
+            )
+
+            # The speculative summary only stands if web results left the
+            # patents it describes unchanged; otherwise it would contradict
+            # similar_patents, so it is rebuilt from the combined ranking
+            if (
+                summary_task is not None
+                and all_results[:COMPETITION_SUMMARY_RESULTS] != speculative_top
+            ):
+                summary_task.cancel()
+                summary_task = None
+
+            # Post-processing: generate competition summary and concept image concurrently
+            if summary_task is None:
+                summary_task = tg.create_task(_gen_competition_summary(all_results))
+            image_task = tg.create_task(_gen_concept_image(all_results))
+
+        competition_summary = summary_task.result()
+        concept_image_url, concept_image_prompt = image_task.result()
+
+        # Create summary
+        local_count = len(local_results)
+        web_count = len(web_results)
+        search_summary = f"Found {local_count} similar patents in local corpus and {web_count} from web search"
 
-        return PatentSearchResponse(
+        response = PatentSearchResponse(
             query_description=patent_desc.description,
             similar_patents=all_results,
             local_results_count=local_count,
@@ -371,6 +704,11 @@ class PatentSearchService:
             concept_image_prompt=concept_image_prompt,
         )
 
+        if cache_vector is not None:
+            await self.semantic_cache.store(cache_vector, cache_params, response)
+
+        return response
+
     async def generate_competition_summary(
         self, query_description: str, results: List[PatentResult]
     ) -> Optional[str]:
@@ -378,9 +716,10 @@ class PatentSearchService:
         if not anthropic_client:
             return None
 
+        parts: List[str] = []
         try:
             # Build compact JSON-like snapshot of top results for the LLM
-            top = results[:8]
+            top = results[:COMPETITION_SUMMARY_RESULTS]
             lines: List[str] = []
             for i, r in enumerate(top, start=1):
                 safe_score = (
@@ -409,16 +748,20 @@ class PatentSearchService:
                 "Avoid legal conclusions; this is not legal advice."
             )
 
-            message = anthropic_client.messages.create(
+            # Stream the completion so a dropped connection or timeout still
+            # yields whatever text was generated
+            async with anthropic_client.messages.stream(
                 model=os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514"),
                 max_tokens=800,
                 system=system,
                 messages=[{"role": "user", "content": prompt}],
-            )
-            return message.content[0].text if message and message.content else None
+            ) as stream:
+                async for text in stream.text_stream:
+                    parts.append(text)
+            return "".join(parts) or None
         except Exception as e:
             logger.error(f"Error generating competition summary: {e}")
-            return None
+            return "".join(parts) or None
 
     def build_image_prompt(
         self, patent_desc: PatentDescription, results: List[PatentResult]
@@ -428,34 +771,48 @@ class PatentSearchService:
         subject = (patent_desc.title or patent_desc.description[:60]).strip()
         subject = subject.replace("\n", " ")
 
-        # Style: isometric sketch drawing on light ivory background
-        style = (
-            "Isometric sketch drawing, three-quarter view. Hand-drawn pencil and ink linework with clean contours, "
-            "light cross-hatching, minimal shading. Light ivory paper background (#f5f5f4) with subtle paper texture. "
-            "Blueprint-style construction hints allowed (light, unobtrusive). No photorealism, no 3D rendering. "
-            "High-resolution scan look, clean edges, aspect 1:1."
+        return IMAGE_PROMPT_TEMPLATE.format(
+            subject=subject, description=patent_desc.description.strip()
         )
 
-        constraints = (
-            "No logos, trademarks, or readable text/labels. Avoid human faces unless essential. "
-            "Emphasize mechanism, function, and form; maintain technical clarity in the sketch."
-        )
+    async def _run_fal_job(
+        self, endpoint: str, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> Optional[Any]:
+        """Submit a FAL queue job, wait for it to complete and return its result."""
+        resp = await self.http_client.post(endpoint, headers=headers, json=payload)
+        if resp.status_code >= 400:
+            logger.warning(f"FAL error {resp.status_code}: {resp.text[:300]}")
+            return None
+        job = resp.json()
+
+        # Poll without holding a connection open while the image renders
+        deadline = time.monotonic() + FAL_TIMEOUT
+        while True:
+            status = await self.http_client.get(job["status_url"], headers=headers)
+            status.raise_for_status()
+            if status.json().get("status") == "COMPLETED":
+                break
+            if time.monotonic() > deadline:
+                logger.warning(f"FAL request {job.get('request_id')} timed out")
+                return None
+            await asyncio.sleep(FAL_POLL_INTERVAL)
 
-        prompt = (
-            f"Concept image of: {subject}. Description: {patent_desc.description.strip()} "
-            f"| Style: {style} | Constraints: {constraints}"
-        )
-        return prompt
+        resp = await self.http_client.get(job["response_url"], headers=headers)
+        if resp.status_code >= 400:
+            logger.warning(f"FAL error {resp.status_code}: {resp.text[:300]}")
+            return None
+        return resp.json()
 
     async def generate_concept_image(self, prompt: str) -> Optional[str]:
-        """Generate an image via FAL REST API and return the image URL."""
+        """Generate an image via the FAL queue API and return the image URL."""
         fal_key = os.getenv("FAL_KEY") or os.getenv("FAL_API_KEY")
-        if not fal_key:
+        if not fal_key or not self.http_client:
             return None
 
         # Configurable model; defaults to a general-purpose image model
         model_id = os.getenv("FAL_MODEL_ID", "fal-ai/flux/schnell")
-        endpoint = f"https://fal.run/{model_id}"
+        endpoint = f"{FAL_QUEUE_URL}/{model_id}"
+        headers = {"Authorization": f"Key {fal_key}"}
 
         # FAL API expects image_size as a dict, and num_inference_steps <= 12
         image_size_str = os.getenv("FAL_IMAGE_SIZE", "1024x1024")
@@ -476,19 +833,8 @@ class PatentSearchService:
         }
 
         try:
-            resp = requests.post(
-                endpoint,
-                headers={
-                    "Authorization": f"Key {fal_key}",
-                    "Content-Type": "application/json",
-                },
-                json=payload,
-                timeout=60,
-            )
-            if resp.status_code >= 400:
-                logger.warning(f"FAL error {resp.status_code}: {resp.text[:300]}")
-                return None
-            data = resp.json()
+            async with fal_semaphore:
+                data = await self._run_fal_job(endpoint, headers, payload)
             # Try common shapes
             # Case 1: { images: [{ url: ... }] }
             if (
@@ -530,22 +876,14 @@ async def root():
         "message": "Patent Search API is running",
         "status": "healthy",
         "patent_corpus_loaded": patent_retriever is not None,
-        "web_search_available": exa_client is not None,
+        "web_search_available": EXA_API_KEY_CONFIGURED,
     }
 
 
 @app.get("/patent/status")
 async def get_patent_status():
     """Get patent search system status."""
-    return {
-        "patent_corpus_loaded": patent_retriever is not None,
-        "corpus_chunks": len(patent_retriever.chunks) if patent_retriever else 0,
-        "web_search_available": exa_client is not None,
-        "api_keys_configured": {
-            "openai": bool(os.getenv("OPENAI_API_KEY")),
-            "exa": bool(os.getenv("EXA_API_KEY")),
-        },
-    }
+    return patent_status
 
 
 @app.post("/patent/search", response_model=PatentSearchResponse)
@@ -567,14 +905,61 @@ async def search_similar_patents(patent_desc: PatentDescription):
         raise HTTPException(status_code=500, detail=f"Patent search error: {str(e)}")
 
 
+@app.post("/patent/search/stream")
+async def stream_similar_patents(patent_desc: PatentDescription):
+    """
+    Same search as /patent/search, streamed as NDJSON.
+
+    Local corpus results are sent one patent per line as soon as they are
+    ranked, then the web results as they arrive, then a final line with the
+    counts, summaries and concept image of the response. Clients rank the
+    patents by similarity_score. A failed search ends with an "error" line.
+    """
+    batches: asyncio.Queue = asyncio.Queue()
+
+    async def _search() -> PatentSearchResponse:
+        try:
+            return await patent_service.search_similar_patents(
+                patent_desc, on_results=batches.put_nowait
+            )
+        finally:
+            batches.put_nowait(None)
+
+    async def _lines():
+        search = asyncio.create_task(_search())
+        try:
+            streamed = False
+            while (patents := await batches.get()) is not None:
+                streamed = True
+                for patent in patents:
+                    yield orjson.dumps(patent.model_dump()) + b"\n"
+
+            result = await search
+            # Semantic cache hits skip the incremental batches
+            if not streamed:
+                for patent in result.similar_patents:
+                    yield orjson.dumps(patent.model_dump()) + b"\n"
+            yield orjson.dumps(result.model_dump(exclude={"similar_patents"})) + b"\n"
+        except Exception as e:
+            logger.error(f"Error in patent search: {e}")
+            yield orjson.dumps({"error": f"Patent search error: {str(e)}"}) + b"\n"
+        finally:
+            # Stop the search if the client disconnects mid-stream
+            search.cancel()
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
 @app.get("/patent/search-local")
-async def search_local_patents(query: str, max_results: int = 5):
+async def search_local_patents(query: str, max_results: int = 5, rerank: bool = True):
     """Search local patent corpus only."""
     if not patent_retriever:
         raise HTTPException(status_code=503, detail="Patent knowledge base not loaded")
 
     try:
-        results = patent_retriever.search_similar_chunks(query, top_k=max_results)
+        results = patent_retriever.search_similar_chunks(
+            query, top_k=max_results, rerank=rerank
+        )
         return {"query": query, "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Local search error: {str(e)}")
@@ -586,9 +971,10 @@ async def reload_patent_kb():
     global patent_retriever
 
     try:
-        current_dir = Path(__file__).parent
-        pickle_path = current_dir / "patent_knowledge_base.pkl"
-        patent_retriever = PatentRAGRetriever(str(pickle_path))
+        patent_retriever = PatentRAGRetriever(str(PATENT_KB_PATH))
+        patent_service.patent_retriever = patent_retriever
+        patent_service.semantic_cache.clear()
+        refresh_patent_status()
         logger.info("Patent knowledge base reloaded successfully")
         return {"message": "Patent knowledge base reloaded successfully"}
     except Exception as e:
@@ -6,17 +6,46 @@ Processes PDF patent documents, creates embeddings, and saves to pickle files.
 
 import os
 import re
+import json
+import random
+import asyncio
 import pickle
+import sqlite3
+import hashlib
 import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from functools import lru_cache, cached_property
 from typing import List, Dict, Any, Tuple
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import PyPDF2
 import openai
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 # Load environment variables
 load_dotenv()
 
@@ -24,21 +53,184 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SQLite file caching embeddings by content, so reprocessing skips unchanged chunks;
+# kept next to this module so the cache does not depend on the working directory
+EMBEDDING_CACHE_PATH = os.getenv(
+    "PATENT_EMBEDDING_CACHE", str(Path(__file__).parent / ".patent_embed_cache.db")
+)
+
+# Model used for document and query embeddings, and for token counting
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Chunk size and overlap, in tokens of the embedding model
+CHUNK_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+
+# Texts sent per embeddings API call while processing documents
+EMBEDDING_BATCH_SIZE = 256
+
+# Token budget per embeddings call, below the API's per-request limit
+EMBEDDING_BATCH_TOKENS = 250_000
+
+# Embedding batches in flight at once, and attempts per batch before falling
+# back to per-item requests
+EMBEDDING_CONCURRENCY = 8
+EMBEDDING_MAX_RETRIES = 3
+
+# Single-query simsimd scans run on the calling thread, since API requests already
+# search concurrently and thread start-up outweighs the kernel on small corpora;
+# only corpora of at least SIMILARITY_PARALLEL_ROWS rows are split across threads
+SIMILARITY_THREADS = os.cpu_count() or 1
+SIMILARITY_PARALLEL_ROWS = 100_000
+
+# Number of ANN candidates rescored exactly in the two-stage search
+ANN_CANDIDATES = 50
+
+# Shortlist size of the int8 scan used as prefilter when faiss is unavailable
+INT8_SHORTLIST = 100
+
+# "cosine" divides by precomputed corpus norms per query; "dot" normalizes the
+# corpus once at load time and scores with a plain inner product. Knowledge bases
+# saved with unit-length embeddings always use the inner product.
+SIMILARITY_METRIC = os.getenv("PATENT_SIMILARITY_METRIC", "cosine")
+
+# Patterns used by clean_patent_text, compiled once
+PAGE_MARKER_RE = re.compile(r'--- Page \d+ ---')
+DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\.\,\;\:\!\?\(\)\[\]\-\"\']')
+
+@lru_cache(maxsize=None)
+def token_encoder(model: str = EMBEDDING_MODEL):
+    """tiktoken encoding for an embedding model, loaded once per process."""
+    return tiktoken.encoding_for_model(model)
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token counts of texts for the embedding model, estimated from length when tiktoken is missing."""
+    if tiktoken is None:
+        return [len(text) // 4 + 1 for text in texts]  # ~4 characters per token
+    return [len(tokens) for tokens in token_encoder().encode_batch(texts, disallowed_special=())]
+
+def aligned_empty(shape: Tuple[int, ...], dtype=np.float32, alignment: int = 64) -> np.ndarray:
+    """Allocate an uninitialized C-contiguous array whose data starts on an `alignment` boundary."""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    buffer = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = -buffer.ctypes.data % alignment
+    return buffer[offset:offset + nbytes].view(dtype).reshape(shape)
+
+def embeddings_path(pickle_path: str) -> Path:
+    """Location of the .npy embedding matrix stored alongside a knowledge base pickle."""
+    return Path(pickle_path).with_suffix('.embeddings.npy')
+
+def quantized_paths(pickle_path: str) -> Tuple[Path, Path]:
+    """Locations of the int8 embedding codes and their per-row scales."""
+    path = Path(pickle_path)
+    return path.with_suffix('.embeddings_i8.npy'), path.with_suffix('.embedding_scales.npy')
+
+def metadata_path(pickle_path: str) -> Path:
+    """Location of the JSON copy of a knowledge base's metadata, readable without unpickling."""
+    return Path(pickle_path).with_suffix('.meta.json')
+
+def load_metadata(pickle_path: str) -> Dict[str, Any]:
+    """Knowledge base metadata from its JSON sidecar, or from the pickle if the sidecar is missing."""
+    path = metadata_path(pickle_path)
+    if path.exists():
+        return json.loads(path.read_text())
+    with open(pickle_path, 'rb') as f:
+        return pickle.load(f)['metadata']
+
+def similarity_threads(rows: int) -> int:
+    """Threads for a single-query simsimd scan over `rows` corpus rows."""
+    return SIMILARITY_THREADS if rows >= SIMILARITY_PARALLEL_ROWS else 1
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit L2 norm into a new aligned array; zero rows stay zero."""
+    normalized = aligned_empty(vectors.shape)
+    np.divide(vectors, np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12), out=normalized)
+    return normalized
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returning codes and per-row scales."""
+    if not len(vectors):
+        # An empty knowledge base has no rows to reduce over
+        return np.empty(vectors.shape, dtype=np.int8), np.empty(0, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales).astype(np.int8)
+    return codes, scales.ravel().astype(np.float32)
+
+class EmbeddingCache:
+    """Persistent content-addressed store of embeddings, keyed by SHA-256 of model and text."""
+    
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        # The API serves queries from its worker threads as well as the event loop,
+        # so the shared connection is only used while holding the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB NOT NULL)')
+    
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{text}".encode()).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Return the cached vectors for whichever keys are present."""
+        found = {}
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return found
+    
+    def put_many(self, items: List[Tuple[bytes, List[float]]]):
+        """Store vectors, skipping zero-vector fallbacks from failed requests."""
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items if any(vec)
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)', rows)
+
 class PatentDocumentProcessor:
     """
     Processes patent PDF documents and creates vector embeddings for semantic search.
     """
     
     def __init__(self, openai_api_key: str = None):
-        """Initialize the processor with OpenAI client."""
-        self.openai_client = openai.OpenAI(
-            api_key=openai_api_key or os.getenv("OPENAI_API_KEY")
-        )
-        self.embedding_model = "text-embedding-3-small"
+        """Initialize the processor; the OpenAI client is created on first use."""
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.embedding_model = EMBEDDING_MODEL
         self.embedding_dimension = 1536
+        self.embedding_cache = EmbeddingCache()
+    
+    @cached_property
+    def openai_client(self) -> openai.OpenAI:
+        """Synchronous OpenAI client, built lazily so workers and utility callers never create one."""
+        return openai.OpenAI(api_key=self.openai_api_key)
+        
+    @staticmethod
+    def extract_text_from_pdf(pdf_path: str) -> str:
+        """Extract raw text from PDF file, using PDFium when available."""
+        if pdfium is not None:
+            try:
+                pdf = pdfium.PdfDocument(pdf_path)
+                try:
+                    pages = []
+                    for page in pdf:
+                        pages.append(page.get_textpage().get_text_range())
+                        page.close()
+                finally:
+                    pdf.close()
+                text_content = "\n".join(pages)
+                logger.info(f"Extracted {len(text_content)} characters from {pdf_path}")
+                return text_content
+            except Exception as e:
+                logger.warning(f"PDFium could not read {pdf_path}, falling back to PyPDF2: {e}")
         
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract raw text from PDF file."""
         try:
             text_content = ""
             with open(pdf_path, 'rb') as file:
@@ -61,100 +253,84 @@ class PatentDocumentProcessor:
             logger.error(f"Error reading PDF {pdf_path}: {e}")
             return ""
     
-    def clean_patent_text(self, text: str) -> str:
+    @staticmethod
+    def clean_patent_text(text: str) -> str:
         """Clean and preprocess patent text with patent-specific patterns."""
         if not text:
             return ""
         
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        # Remove excessive whitespace (str.split handles the same Unicode whitespace
+        # as \s, without the regex engine)
+        text = ' '.join(text.split())
         
         # Remove page headers/footers that are common in patent docs
-        text = re.sub(r'--- Page \d+ ---', '', text)
-        
-        # Clean up patent-specific formatting
-        # Remove excessive line breaks around patent sections
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-        
-        # Remove patent office boilerplate (common patterns)
-        text = re.sub(r'U\.S\. Patent.*?(?=\n|\s{5,})', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'Patent No\..*?(?=\n|\s{5,})', '', text, flags=re.IGNORECASE)
-        
-        # Clean up claim numbering (preserve structure but clean formatting)
-        text = re.sub(r'(\d+\.)\s+', r'\1 ', text)
+        text = PAGE_MARKER_RE.sub('', text)
         
         # Remove excessive punctuation
-        text = re.sub(r'[^\w\s\.\,\;\:\!\?\(\)\[\]\-\"\']', ' ', text)
+        text = DISALLOWED_CHARS_RE.sub(' ', text)
         
         # Clean up spacing
         text = ' '.join(text.split())
         
         return text.strip()
     
-    def chunk_patent_text(self, text: str, chunk_size: int = 1000, overlap: int = 100) -> List[Dict[str, Any]]:
+    @staticmethod
+    def chunk_patent_text(text: str, chunk_size: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
         """
         Split patent text into overlapping chunks, respecting patent document structure.
+        Sizes are in tokens of the embedding model.
         """
         if not text:
             return []
         
         # Split into sentences for better chunk boundaries
         sentences = re.split(r'(?<=[.!?])\s+', text)
+        # Token counts for every sentence in one batched encode
+        sentence_tokens = count_tokens(sentences)
         
         chunks = []
-        current_chunk = ""
+        # Sentences of the current chunk, joined with spaces only when it is emitted
+        current_chunk: List[str] = []
         current_size = 0
+        # Rolling window of the chunk's trailing (sentence, tokens) that fit in the
+        # overlap, and their total tokens; the next chunk starts with it
+        tail: deque = deque()
+        tail_size = 0
         chunk_index = 0
         sentence_index = 0
         
-        for i, sentence in enumerate(sentences):
-            sentence_length = len(sentence)
-            
+        for i, (sentence, sentence_length) in enumerate(zip(sentences, sentence_tokens)):
             # Check if adding this sentence would exceed chunk size
             if current_size + sentence_length > chunk_size and current_chunk:
                 # Save current chunk
                 chunks.append({
-                    'text': current_chunk.strip(),
+                    'text': " ".join(current_chunk).strip(),
                     'index': chunk_index,
                     'size': current_size,
                     'start_sentence': sentence_index
                 })
                 
-                # Start new chunk with overlap
+                # Start new chunk with the overlap sentences
                 chunk_index += 1
-                
-                # For overlap, include last few sentences from previous chunk
-                if overlap > 0 and len(chunks) > 0:
-                    overlap_sentences = []
-                    temp_overlap = 0
-                    
-                    # Work backwards from current sentence to get overlap
-                    for j in range(i-1, max(0, i-10), -1):
-                        if temp_overlap + len(sentences[j]) <= overlap:
-                            overlap_sentences.insert(0, sentences[j])
-                            temp_overlap += len(sentences[j])
-                        else:
-                            break
-                    
-                    current_chunk = " ".join(overlap_sentences) + " " if overlap_sentences else ""
-                    current_size = len(current_chunk)
-                    sentence_index = max(0, i - len(overlap_sentences))
-                else:
-                    current_chunk = ""
-                    current_size = 0
-                    sentence_index = i
+                current_chunk = [overlap_sentence for overlap_sentence, _ in tail]
+                current_size = tail_size
+                sentence_index = i - len(tail)
             
             # Add current sentence to chunk
-            if current_chunk:
-                current_chunk += " " + sentence
-            else:
-                current_chunk = sentence
+            if current_chunk or sentence:
+                current_chunk.append(sentence)
+                if overlap > 0:
+                    tail.append((sentence, sentence_length))
+                    tail_size += sentence_length
+                    while tail_size > overlap:
+                        tail_size -= tail.popleft()[1]
             current_size += sentence_length
         
         # Add final chunk if it has content
-        if current_chunk.strip():
+        final_text = " ".join(current_chunk).strip()
+        if final_text:
             chunks.append({
-                'text': current_chunk.strip(),
+                'text': final_text,
                 'index': chunk_index,
                 'size': current_size,
                 'start_sentence': sentence_index
@@ -165,49 +341,176 @@ class PatentDocumentProcessor:
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using OpenAI API."""
+        key = EmbeddingCache.key(self.embedding_model, text)
+        cached = self.embedding_cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        
         try:
             response = self.openai_client.embeddings.create(
                 model=self.embedding_model,
                 input=text,
                 encoding_format="float"
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            self.embedding_cache.put_many([(key, embedding)])
+            return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             # Return zero vector as fallback
             return [0.0] * self.embedding_dimension
     
-    def process_document(self, pdf_path: str, document_name: str = None) -> Dict[str, Any]:
-        """Process a single patent PDF document."""
+    def generate_embeddings_batch(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+        """Generate embeddings for many texts with one API call per batch, preserving input order."""
+        return asyncio.run(self.agenerate_embeddings_batch(texts, batch_size))
+    
+    async def agenerate_embeddings_batch(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+                                         client: openai.AsyncOpenAI = None,
+                                         semaphore: asyncio.Semaphore = None) -> List[List[float]]:
+        """
+        Embed all batches concurrently, with at most EMBEDDING_CONCURRENCY requests in flight.
+        
+        Callers embedding several documents at once pass a shared client and semaphore so
+        the concurrency limit holds across all of them.
+        """
+        # Only texts missing from the embedding cache go to the API
+        keys = [EmbeddingCache.key(self.embedding_model, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        embeddings = [cached.get(key) for key in keys]
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        logger.info(f"Embedding cache: {len(texts) - len(misses)} hits, {len(misses)} misses")
+        if not misses:
+            return embeddings
+        
+        # Repeated chunks (boilerplate, claim headers) are embedded once; each duplicate
+        # maps to the first miss with the same content key
+        first_miss: Dict[bytes, int] = {}
+        duplicates: Dict[int, int] = {}
+        for i in misses:
+            duplicates[i] = first_miss.setdefault(keys[i], i)
+        unique_misses = list(first_miss.values())
+        if len(unique_misses) < len(misses):
+            logger.info(f"Skipping {len(misses) - len(unique_misses)} duplicate texts")
+        
+        # Longest texts first, so each batch groups texts of similar length and no
+        # single outlier dominates a batch's latency
+        order = sorted(unique_misses, key=lambda i: -len(texts[i]))
+        
+        token_counts = dict(zip(order, count_tokens([texts[i] for i in order])))
+        batches = []
+        batch, batch_tokens = [], 0
+        for i in order:
+            tokens = token_counts[i]
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > EMBEDDING_BATCH_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(texts[i])
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        
+        # Without a shared client, open one for this call only; its connection pool
+        # is bound to the running event loop
+        owned = openai.AsyncOpenAI(api_key=self.openai_api_key) if client is None else None
+        async with owned or nullcontext(client) as client:
+            semaphore = semaphore or asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+            results = await asyncio.gather(
+                *(self._aembed_batch(client, batch, semaphore) for batch in batches)
+            )
+        
+        # Scatter back into input order
+        sorted_embeddings = (embedding for batch_embeddings in results for embedding in batch_embeddings)
+        for i, embedding in zip(order, sorted_embeddings):
+            embeddings[i] = embedding
+        for i, first in duplicates.items():
+            embeddings[i] = embeddings[first]
+        
+        self.embedding_cache.put_many([(keys[i], embeddings[i]) for i in unique_misses])
+        return embeddings
+    
+    async def _aembed_batch(self, client: openai.AsyncOpenAI, batch: List[str],
+                            semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """Embed one batch, backing off on transient errors and falling back to per-item calls."""
+        async with semaphore:
+            for attempt in range(EMBEDDING_MAX_RETRIES):
+                try:
+                    response = await client.embeddings.create(
+                        model=self.embedding_model,
+                        input=batch,
+                        encoding_format="float"
+                    )
+                    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+                except openai.BadRequestError as e:
+                    # Retrying will not help; find the offending input item by item
+                    logger.warning(f"Embedding batch rejected: {e}")
+                    break
+                except openai.APIError as e:
+                    logger.warning(f"Embedding batch failed (attempt {attempt + 1}): {e}")
+                    if attempt + 1 < EMBEDDING_MAX_RETRIES:
+                        # Jittered exponential backoff keeps batches from retrying in lockstep
+                        await asyncio.sleep(2 ** attempt + random.random())
+            
+            # Fall back to per-item calls so one bad input does not sink the batch
+            return [await self._aembed_one(client, text) for text in batch]
+    
+    async def _aembed_one(self, client: openai.AsyncOpenAI, text: str) -> List[float]:
+        """Async counterpart of generate_embedding, including its zero-vector fallback."""
+        try:
+            response = await client.embeddings.create(
+                model=self.embedding_model,
+                input=text,
+                encoding_format="float"
+            )
+            return response.data[0].embedding
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            return [0.0] * self.embedding_dimension
+    
+    @staticmethod
+    def prepare_document(pdf_path: str, document_name: str = None) -> Dict[str, Any]:
+        """
+        Extract, clean and chunk a patent PDF.
+        
+        This is the CPU-bound part of processing and needs no API client, so
+        process_patent_documents runs it in worker processes.
+        """
         if document_name is None:
             document_name = Path(pdf_path).stem
         
         logger.info(f"Processing patent document: {document_name}")
         
         # Extract text
-        raw_text = self.extract_text_from_pdf(pdf_path)
+        raw_text = PatentDocumentProcessor.extract_text_from_pdf(pdf_path)
         if not raw_text:
             logger.error(f"No text extracted from {pdf_path}")
             return None
         
         # Clean text with patent-specific cleaning
-        clean_text = self.clean_patent_text(raw_text)
+        clean_text = PatentDocumentProcessor.clean_patent_text(raw_text)
         
         # Create chunks
-        chunks = self.chunk_patent_text(clean_text)
+        chunks = PatentDocumentProcessor.chunk_patent_text(clean_text)
         logger.info(f"Created {len(chunks)} chunks for {document_name}")
         
-        # Generate embeddings for each chunk
+        return {
+            'document_name': document_name,
+            'document_path': pdf_path,
+            'chunks': chunks,
+            'original_text_length': len(raw_text),
+            'clean_text_length': len(clean_text)
+        }
+    
+    def build_document(self, prepared: Dict[str, Any], embeddings: List[List[float]]) -> Dict[str, Any]:
+        """Assemble a processed document from prepare_document output and its chunk embeddings."""
+        document_name = prepared['document_name']
+        pdf_path = prepared['document_path']
+        
         processed_chunks = []
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Generating embedding for chunk {i+1}/{len(chunks)}")
-            embedding = self.generate_embedding(chunk['text'])
-            
+        for chunk in prepared['chunks']:
             processed_chunks.append({
                 'chunk_id': f"{document_name}_chunk_{chunk['index']}",
                 'document_name': document_name,
                 'text': chunk['text'],
-                'embedding': embedding,
                 'metadata': {
                     'chunk_index': chunk['index'],
                     'size': chunk['size'],
@@ -222,14 +525,56 @@ class PatentDocumentProcessor:
             'document_path': pdf_path,
             'total_chunks': len(processed_chunks),
             'chunks': processed_chunks,
+            # One float32 row per chunk, kept out of the chunk dicts
+            'embeddings': np.asarray(embeddings, dtype=np.float32).reshape(-1, self.embedding_dimension),
             'metadata': {
-                'original_text_length': len(raw_text),
-                'clean_text_length': len(clean_text),
+                'original_text_length': prepared['original_text_length'],
+                'clean_text_length': prepared['clean_text_length'],
                 'embedding_model': self.embedding_model,
                 'document_type': 'patent'
             }
         }
     
+    def process_document(self, pdf_path: str, document_name: str = None) -> Dict[str, Any]:
+        """Process a single patent PDF document."""
+        prepared = self.prepare_document(pdf_path, document_name)
+        if prepared is None:
+            return None
+        
+        # Generate embeddings for all chunks in batched API calls
+        embeddings = self.generate_embeddings_batch([chunk['text'] for chunk in prepared['chunks']])
+        return self.build_document(prepared, embeddings)
+    
+    async def aprocess_documents(self, pdf_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Process PDFs as a pipeline: each document's chunks are embedded as soon as its
+        extraction finishes, while other PDFs are still being extracted.
+        
+        Extraction is CPU-bound pure Python, so it runs in worker processes; the API
+        client stays in this process. Documents are returned in input order.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        workers = min(os.cpu_count() or 1, len(pdf_paths))
+        
+        async with openai.AsyncOpenAI(api_key=self.openai_api_key) as client:
+            with ProcessPoolExecutor(workers) as pool:
+                async def process(pdf_path: str) -> Dict[str, Any]:
+                    prepared = await loop.run_in_executor(pool, self.prepare_document, pdf_path)
+                    if prepared is None:
+                        return None
+                    embeddings = await self.agenerate_embeddings_batch(
+                        [chunk['text'] for chunk in prepared['chunks']],
+                        client=client, semaphore=semaphore
+                    )
+                    return self.build_document(prepared, embeddings)
+                
+                # The task group cancels the remaining documents if one fails
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [tg.create_task(process(pdf_path)) for pdf_path in pdf_paths]
+        
+        return [task.result() for task in tasks if task.result()]
+    
     def process_patent_documents(self, patent_data_dir: str) -> Dict[str, Any]:
         """Process all patent PDFs in the specified directory."""
         patent_data_path = Path(patent_data_dir)
@@ -243,18 +588,21 @@ class PatentDocumentProcessor:
         
         logger.info(f"Found {len(pdf_files)} patent PDF files to process")
         
+        documents = asyncio.run(self.aprocess_documents([str(f) for f in pdf_files]))
+        
         all_documents = []
         all_chunks = []
+        all_embeddings = []
         
-        for pdf_file in pdf_files:
-            document_data = self.process_document(str(pdf_file))
-            if document_data:
-                all_documents.append(document_data)
-                all_chunks.extend(document_data['chunks'])
+        for document_data in documents:
+            all_embeddings.append(document_data.pop('embeddings'))
+            all_documents.append(document_data)
+            all_chunks.extend(document_data['chunks'])
         
         patent_knowledge_base = {
             'documents': all_documents,
             'all_chunks': all_chunks,
+            'embeddings_matrix': np.concatenate(all_embeddings) if all_embeddings else np.empty((0, self.embedding_dimension), dtype=np.float32),
             'metadata': {
                 'total_documents': len(all_documents),
                 'total_chunks': len(all_chunks),
@@ -268,10 +616,52 @@ class PatentDocumentProcessor:
         return patent_knowledge_base
     
     def save_to_pickle(self, data: Dict[str, Any], pickle_path: str):
-        """Save processed patent data to pickle file."""
+        """
+        Save processed patent data to pickle file.
+        
+        Chunk embeddings are written separately to an .npy file next to the pickle, which
+        PatentRAGRetriever memory-maps instead of unpickling millions of floats. They come
+        from 'embeddings_matrix', or from per-chunk 'embedding' lists in older knowledge bases.
+        Their int8 codes and per-row scales are saved alongside for the quantized prefilter,
+        and the metadata is copied to a small JSON sidecar for status and info probes.
+        """
         try:
+            chunks = data['all_chunks']
+            embeddings = None
+            if 'embeddings_matrix' in data:
+                data = dict(data)
+                embeddings = data.pop('embeddings_matrix')
+                data['metadata'] = {**data['metadata'], 'embeddings_normalized': True}
+            elif chunks and 'embedding' in chunks[0]:
+                embeddings = np.array([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+                
+                # Document entries share chunk dicts with all_chunks; keep that sharing
+                stripped = {
+                    id(chunk): {k: v for k, v in chunk.items() if k != 'embedding'}
+                    for chunk in chunks
+                }
+                data = {
+                    **data,
+                    'documents': [
+                        {**doc, 'chunks': [stripped.get(id(c), c) for c in doc.get('chunks', [])]}
+                        for doc in data.get('documents', [])
+                    ],
+                    'all_chunks': [stripped[id(chunk)] for chunk in chunks],
+                    'metadata': {**data['metadata'], 'embeddings_normalized': True},
+                }
+            
+            if embeddings is not None:
+                # Stored unit-length, so cosine similarity is a plain inner product at query time
+                embeddings = normalize_rows(embeddings)
+                codes, scales = quantize_int8(embeddings)
+                codes_path, scales_path = quantized_paths(pickle_path)
+                np.save(embeddings_path(pickle_path), embeddings)
+                np.save(codes_path, codes)
+                np.save(scales_path, scales)
+            
             with open(pickle_path, 'wb') as f:
-                pickle.dump(data, f)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            metadata_path(pickle_path).write_text(json.dumps(data['metadata'], indent=2, default=str) + '\n')
             logger.info(f"Patent knowledge base saved to {pickle_path}")
         except Exception as e:
             logger.error(f"Error saving to pickle: {e}")
@@ -282,48 +672,291 @@ class PatentRAGRetriever:
     
     def __init__(self, pickle_path: str):
         """Initialize retriever with pickled patent knowledge base."""
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.embedding_model = "text-embedding-3-small"
+        self.embedding_model = EMBEDDING_MODEL
+        self.embedding_cache = EmbeddingCache()
         
         with open(pickle_path, 'rb') as f:
             self.knowledge_base = pickle.load(f)
         
         self.chunks = self.knowledge_base['all_chunks']
-        self.embeddings = np.array([chunk['embedding'] for chunk in self.chunks])
         
-        logger.info(f"Loaded patent knowledge base with {len(self.chunks)} chunks")
+        # Per-field columns, so building search results indexes lists instead of chunk dicts
+        self.texts, self.document_names, self.chunk_ids, self.chunk_metadata = [], [], [], []
+        for chunk in self.chunks:
+            self.texts.append(chunk['text'])
+            self.document_names.append(chunk['document_name'])
+            self.chunk_ids.append(chunk['chunk_id'])
+            self.chunk_metadata.append(chunk['metadata'])
+        
+        self.embeddings = self._load_embeddings(pickle_path)
+        self.normalized = self.knowledge_base['metadata'].get('embeddings_normalized', False)
+        if SIMILARITY_METRIC == "dot" and not self.normalized and self.chunks:
+            self.embeddings = normalize_rows(self.embeddings)
+            self.normalized = True
+        self.ann_index = self._build_ann_index(pickle_path)
+        self.embeddings_i8, self.embedding_scales = self._load_quantized(pickle_path)
+        self.embedding_norms = np.linalg.norm(self.embeddings, axis=1).clip(min=1e-12)
+        # Per-row factor turning int8 code dot products back into cosine similarities
+        self.int8_row_factors = self.embedding_scales / self.embedding_norms
+        self._chunk_count = len(self.chunks)
+        
+        logger.info(f"Loaded patent knowledge base with {self._chunk_count} chunks")
+    
+    @cached_property
+    def openai_client(self) -> openai.OpenAI:
+        """OpenAI client for query embeddings, built on the first query that misses the cache."""
+        return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    
+    def _load_embeddings(self, pickle_path: str) -> np.ndarray:
+        """
+        Load the chunk embedding matrix from the .npy file next to the knowledge base.
+        
+        Knowledge bases written by save_to_pickle store embeddings only in that file. Older
+        pickles keep them inline per chunk; for those the .npy file is built on first load
+        and reused as a cache until the pickle changes.
+        
+        The matrix is memory-mapped, so restarts skip converting per-chunk Python lists,
+        and workers loading the same knowledge base share its pages.
+        """
+        if not self.chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        npy_path = embeddings_path(pickle_path)
+        
+        if 'embedding' not in self.chunks[0]:
+            embeddings = self._map_embeddings(npy_path)
+            if embeddings is None:
+                raise FileNotFoundError(
+                    f"Embedding file {npy_path} is missing or does not match the knowledge base"
+                )
+            return embeddings
+        
+        if npy_path.exists() and npy_path.stat().st_mtime >= Path(pickle_path).stat().st_mtime:
+            embeddings = self._map_embeddings(npy_path)
+            if embeddings is not None:
+                return embeddings
+        
+        dim = len(self.chunks[0]['embedding'])
+        embeddings = aligned_empty((len(self.chunks), dim))
+        for i, chunk in enumerate(self.chunks):
+            embeddings[i] = chunk['embedding']
+        
+        # Write atomically so a concurrent load never sees a partial file
+        tmp_path = npy_path.with_name(npy_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, embeddings)
+            os.replace(tmp_path, npy_path)
+        except OSError as e:
+            logger.warning(f"Could not write embedding cache {npy_path}: {e}")
+        
+        return embeddings
+    
+    def _load_quantized(self, pickle_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Memory-map the int8 codes saved with the knowledge base, or quantize in memory."""
+        codes_path, scales_path = quantized_paths(pickle_path)
+        if self.normalized and codes_path.exists() and scales_path.exists():
+            try:
+                codes = np.load(codes_path, mmap_mode='r')
+                scales = np.load(scales_path)
+                if codes.shape == self.embeddings.shape and scales.shape == (len(self.chunks),):
+                    return codes, scales
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read quantized embeddings {codes_path}: {e}")
+        return quantize_int8(self.embeddings)
+    
+    def _map_embeddings(self, npy_path: Path) -> np.ndarray:
+        """Memory-map an embedding matrix, returning None if it is absent or does not fit the chunks."""
+        try:
+            embeddings = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read embedding file {npy_path}: {e}")
+            return None
+        
+        if embeddings.shape[0] != len(self.chunks) or embeddings.dtype != np.float32:
+            return None
+        
+        if hasattr(os, 'posix_fadvise'):
+            fd = os.open(npy_path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        return embeddings
+    
+    def _build_ann_index(self, pickle_path: str):
+        """
+        Build an int8 HNSW index used to prefilter candidates before the exact rerank.
+        
+        The index is saved next to the knowledge base and reused until the embedding
+        matrix changes, since building the HNSW graph dominates load time.
+        """
+        if faiss is None or not self.chunks:
+            return None
+        
+        index_path = Path(pickle_path).with_suffix('.faiss')
+        npy_path = embeddings_path(pickle_path)
+        if index_path.exists() and npy_path.exists() and index_path.stat().st_mtime >= npy_path.stat().st_mtime:
+            try:
+                index = faiss.read_index(str(index_path))
+                if index.ntotal == len(self.chunks) and index.d == self.embeddings.shape[1]:
+                    return index
+            except RuntimeError as e:
+                logger.warning(f"Could not read ANN index {index_path}: {e}")
+        
+        vectors = np.array(self.embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexHNSWSQ(
+            vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vectors)
+        index.add(vectors)
+        
+        try:
+            faiss.write_index(index, str(index_path))
+        except RuntimeError as e:
+            logger.warning(f"Could not write ANN index {index_path}: {e}")
+        return index
+    
+    def _similarities(self, query_embedding: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Cosine similarity of a (1, d) query against the corpus or a subset of its rows."""
+        corpus = self.embeddings if rows is None else self.embeddings[rows]
+        query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+        
+        if self.normalized:
+            if simsimd is not None:
+                return np.asarray(simsimd.cdist(query, corpus, metric="dot", threads=similarity_threads(len(corpus))))[0]
+            return corpus @ query[0]
+        
+        if simsimd is not None:
+            return 1.0 - np.asarray(simsimd.cdist(query_embedding, corpus, metric="cosine", threads=similarity_threads(len(corpus))))[0]
+        norms = self.embedding_norms if rows is None else self.embedding_norms[rows]
+        return (corpus @ query[0]) / norms
+    
+    def _int8_similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity against the int8-quantized corpus."""
+        query_codes, query_scale = quantize_int8(query_embedding)
+        dots = np.asarray(simsimd.cdist(query_codes, self.embeddings_i8, metric="dot", threads=similarity_threads(len(self.embeddings_i8))))[0]
+        query_norm = max(np.linalg.norm(query_embedding), 1e-12)
+        return dots * (query_scale[0] / query_norm) * self.int8_row_factors
     
     def generate_query_embedding(self, query: str) -> List[float]:
-        """Generate embedding for search query."""
+        """Generate embedding for search query, reusing cached embeddings of repeated queries."""
+        key = EmbeddingCache.key(self.embedding_model, query)
+        cached = self.embedding_cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        
         response = self.openai_client.embeddings.create(
             model=self.embedding_model,
             input=query,
             encoding_format="float"
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        self.embedding_cache.put_many([(key, embedding)])
+        return embedding
     
-    def search_similar_chunks(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Find most similar patent chunks to the query."""
-        query_embedding = np.array(self.generate_query_embedding(query)).reshape(1, -1)
-        
-        # Calculate cosine similarities
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
+    def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries with one API call for all of those missing from the cache."""
+        keys = [EmbeddingCache.key(self.embedding_model, query) for query in queries]
+        cached = self.embedding_cache.get_many(keys)
+        misses = [i for i, key in enumerate(keys) if key not in cached]
         
-        # Get top-k most similar chunks
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        if misses:
+            response = self.openai_client.embeddings.create(
+                model=self.embedding_model,
+                input=[queries[i] for i in misses],
+                encoding_format="float"
+            )
+            fresh = [(keys[misses[item.index]], item.embedding) for item in response.data]
+            self.embedding_cache.put_many(fresh)
+            cached.update(fresh)
         
+        return [cached[key] for key in keys]
+    
+    def _results(self, indices: np.ndarray, similarities: np.ndarray) -> List[Dict[str, Any]]:
+        """Result dicts for chunk indices and their similarities, already in rank order."""
         results = []
-        for idx in top_indices:
-            chunk = self.chunks[idx]
+        for idx, similarity in zip(indices.tolist(), similarities.tolist()):
             results.append({
-                'text': chunk['text'],
-                'similarity': float(similarities[idx]),
-                'document_name': chunk['document_name'],
-                'chunk_id': chunk['chunk_id'],
-                'metadata': chunk['metadata']
+                'text': self.texts[idx],
+                'similarity': similarity,
+                'document_name': self.document_names[idx],
+                'chunk_id': self.chunk_ids[idx],
+                'metadata': self.chunk_metadata[idx]
             })
-        
         return results
+    
+    def search_similar_chunks(self, query: str, top_k: int = 5, rerank: bool = True,
+                              query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """
+        Find most similar patent chunks to the query.
+        
+        Candidates are prefiltered with the int8 HNSW index (or, without faiss, an
+        int8 SimSIMD scan) and, if rerank is set, rescored with exact FP32 cosine
+        similarity. A precomputed query_embedding skips the embedding API call.
+        """
+        if query_embedding is None:
+            query_embedding = self.generate_query_embedding(query)
+        query_embedding = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+        
+        if self.ann_index is not None:
+            # Stage 1: cheap int8 HNSW prefilter
+            normalized_query = query_embedding.copy()
+            faiss.normalize_L2(normalized_query)
+            k = min(max(ANN_CANDIDATES, top_k), len(self.chunks))
+            scores, candidates = self.ann_index.search(normalized_query, k)
+            found = candidates[0] >= 0
+            candidates = candidates[0][found]
+            similarities = scores[0][found]
+        elif simsimd is not None and len(self.chunks) > INT8_SHORTLIST:
+            # Stage 1: int8 scan of the whole corpus
+            scores = self._int8_similarities(query_embedding)
+            k = min(max(INT8_SHORTLIST, top_k), len(scores))
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            similarities = scores[candidates]
+        else:
+            candidates = np.arange(len(self.chunks))
+            similarities = self._similarities(query_embedding)
+            rerank = False
+        
+        # Stage 2: exact cosine over the candidate rows only
+        if rerank and len(candidates):
+            similarities = self._similarities(query_embedding, candidates)
+        
+        # Get top-k most similar chunks: O(N) partition, then sort only those k
+        k = min(top_k, len(similarities))
+        if k <= 0:
+            return []
+        top_positions = np.argpartition(-similarities, k - 1)[:k]
+        top_positions = top_positions[np.argsort(-similarities[top_positions])]
+        
+        return self._results(candidates[top_positions], similarities[top_positions])
+    
+    def search_similar_chunks_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Exact cosine top-k for several queries at once: one embeddings call and a single
+        (queries x chunks) matrix product instead of a corpus scan per query.
+        """
+        if not queries:
+            return []
+        k = min(top_k, len(self.chunks))
+        if k <= 0:
+            return [[] for _ in queries]
+        
+        query_embeddings = np.array(self.generate_query_embeddings(queries), dtype=np.float32)
+        query_embeddings /= np.linalg.norm(query_embeddings, axis=1, keepdims=True).clip(min=1e-12)
+        scores = query_embeddings @ self.embeddings.T
+        if not self.normalized:
+            scores /= self.embedding_norms
+        
+        top_indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top_indices, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        return [self._results(indices, row_scores) for indices, row_scores in zip(top_indices, top_scores)]
 
 def main():
     """Main function to process patent documents."""
@@ -334,12 +967,31 @@ def main():
                        help="Directory containing patent PDF files")
     parser.add_argument("--output-pickle", default="patent_knowledge_base.pkl",
                        help="Output pickle file path")
+    parser.add_argument("--migrate", metavar="PICKLE",
+                       help="Rewrite an existing knowledge base with embeddings in a separate .npy file")
+    parser.add_argument("--info", metavar="PICKLE",
+                       help="Print the metadata of an existing knowledge base")
     
     args = parser.parse_args()
     
+    if args.info:
+        metadata = load_metadata(args.info)
+        print(f"📄 Documents processed: {metadata['total_documents']}")
+        print(f"📝 Total chunks: {metadata['total_chunks']}")
+        print(f"🧠 Embedding model: {metadata['embedding_model']}")
+        print(f"🕒 Processed at: {metadata['processed_at']}")
+        return
+    
     # Initialize processor
     processor = PatentDocumentProcessor()
     
+    if args.migrate:
+        with open(args.migrate, 'rb') as f:
+            knowledge_base = pickle.load(f)
+        processor.save_to_pickle(knowledge_base, args.migrate)
+        print(f"💾 Embeddings moved to: {embeddings_path(args.migrate)}")
+        return
+    
     try:
         # Process documents
         knowledge_base = processor.process_patent_documents(args.patent_data_dir)
@@ -12,9 +12,15 @@ from pathlib import Path
 from typing import Dict, Any
 from dotenv import load_dotenv
 
+# Paths used by the setup steps, resolved once
+HERE = Path(__file__).resolve().parent
+BACKEND_DIR = HERE.parent
+PATENT_DATA_DIR = HERE / "patent_data"
+PICKLE_FILE = HERE / "patent_knowledge_base.pkl"
+
 # Add the parent directory to sys.path to import our modules
-sys.path.append(str(Path(__file__).parent))
-sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(HERE))
+sys.path.append(str(BACKEND_DIR))
 
 from patent_doc_processor import PatentDocumentProcessor
 
@@ -28,8 +34,6 @@ logger = logging.getLogger(__name__)
 
 def check_environment():
     """Check if required environment variables are set."""
-    load_dotenv()
-    
     required_vars = ['OPENAI_API_KEY']
     missing_vars = []
     
@@ -48,8 +52,7 @@ def check_environment():
 
 def check_patent_data():
     """Check if patent data directory exists and contains PDF files."""
-    current_dir = Path(__file__).parent
-    patent_data_dir = current_dir / "patent_data"
+    patent_data_dir = PATENT_DATA_DIR
     
     if not patent_data_dir.exists():
         logger.error(f"❌ Patent data directory not found: {patent_data_dir}")
@@ -71,9 +74,8 @@ def check_patent_data():
 def process_documents():
     """Process patent documents and create embeddings."""
     try:
-        current_dir = Path(__file__).parent
-        patent_data_dir = current_dir / "patent_data"
-        output_pickle = current_dir / "patent_knowledge_base.pkl"
+        patent_data_dir = PATENT_DATA_DIR
+        output_pickle = PICKLE_FILE
         
         logger.info("🚀 Starting patent document processing...")
         
@@ -109,8 +111,7 @@ def install_dependencies():
         logger.info("📦 Checking Python dependencies...")
         
         # Check if requirements.txt exists in backend directory
-        backend_dir = Path(__file__).parent.parent
-        requirements_file = backend_dir / "requirements.txt"
+        requirements_file = BACKEND_DIR / "requirements.txt"
         
         if not requirements_file.exists():
             logger.warning("⚠️  requirements.txt not found in backend directory")
@@ -135,8 +136,7 @@ def install_dependencies():
 
 def create_env_template():
     """Create environment template file if it doesn't exist."""
-    current_dir = Path(__file__).parent
-    env_example = current_dir / "env.example"
+    env_example = HERE / "env.example"
     
     if env_example.exists():
         logger.info("✅ env.example already exists")
@@ -210,9 +210,7 @@ def main():
     print("  2. Run test_patent_system.py to verify everything works")
     print("  3. Integrate with your application using the patent_doc_processor module")
     
-    current_dir = Path(__file__).parent
-    pickle_file = current_dir / "patent_knowledge_base.pkl"
-    print(f"\n📁 Knowledge base location: {pickle_file}")
+    print(f"\n📁 Knowledge base location: {PICKLE_FILE}")
     
     return True
 
@@ -4,76 +4,180 @@ Test Script for Patent Search API
 Tests the patent API endpoints and search functionality.
 """
 
+import sys
 import asyncio
-import json
-import requests
-from typing import Dict, Any, Optional
+import httpx
+import orjson
+from typing import Awaitable, Dict, Any, Iterator, List, Optional, Tuple
 from pathlib import Path
 
 # Configuration
 API_BASE_URL = "http://localhost:8001"
 
-def test_api_health():
+# Similarity searches wait on web search and summaries, so reads get a long timeout
+REQUEST_TIMEOUT = httpx.Timeout(120, connect=3)
+CONNECTION_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=16)
+
+# HTTP/2-capable keep-alive client, created by main() for SYNC_CLIENT_COMMANDS only
+CLIENT: Optional[httpx.Client] = None
+
+def _sync_client() -> httpx.Client:
+    """Blocking client for the interactive mode, retrying failed connects."""
+    return httpx.Client(
+        base_url=API_BASE_URL,
+        http2=True,
+        limits=CONNECTION_LIMITS,
+        timeout=REQUEST_TIMEOUT,
+        transport=httpx.HTTPTransport(http2=True, retries=2)
+    )
+
+def _async_client() -> httpx.AsyncClient:
+    """Async client with the same settings, shared by the concurrently running tests."""
+    return httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        http2=True,
+        limits=CONNECTION_LIMITS,
+        timeout=REQUEST_TIMEOUT,
+        transport=httpx.AsyncHTTPTransport(http2=True, retries=2)
+    )
+
+async def _settle(awaitable: Awaitable) -> Any:
+    """
+    Await a request and return its exception instead of raising, so a test can print
+    its whole report without yielding to the other tests in between.
+    """
+    try:
+        return await awaitable
+    except Exception as e:
+        return e
+
+# Request bodies are encoded with orjson and sent as raw bytes
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+async def _fetch_json(client: httpx.AsyncClient, path: str) -> Dict[str, Any]:
+    """GET an endpoint from the live server and return its decoded JSON body."""
+    response = await client.get(path)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+# NDJSON records of completed interactive searches, keyed by (description, title)
+_search_cache: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+
+def _stream_search(description: str, title: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the NDJSON records of an interactive search as they arrive: one per local
+    patent, one per web patent, then the summary record (or an error record).
+    Repeating a successful query in a session replays the earlier records.
+    """
+    key = (description, title)
+    if key in _search_cache:
+        yield from _search_cache[key]
+        return
+    
+    records = []
+    payload = {
+        "description": description,
+        "title": title,
+        "use_web_search": True,
+        "use_local_corpus": True,
+        "max_local_results": 3,
+        "max_web_results": 3
+    }
+    with CLIENT.stream("POST", "/patent/search/stream", content=orjson.dumps(payload),
+                       headers=JSON_HEADERS) as response:
+        if response.is_error:
+            response.read()
+            response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                record = orjson.loads(line)
+                records.append(record)
+                yield record
+    if not any("error" in record for record in records):
+        _search_cache[key] = records
+
+async def _post_search(client: httpx.AsyncClient, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST a similarity search to /patent/search and return the decoded response."""
+    response = await client.post("/patent/search", content=orjson.dumps(payload),
+                                 headers=JSON_HEADERS)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+async def _read_stream(client: httpx.AsyncClient, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """NDJSON records of a /patent/search/stream search, parsed line by line."""
+    records = []
+    async with client.stream("POST", "/patent/search/stream", content=orjson.dumps(payload),
+                             headers=JSON_HEADERS) as response:
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                records.append(orjson.loads(line))
+    return records
+
+async def check_api_health(client: httpx.AsyncClient):
     """Test the API health check endpoint."""
-    print("🔍 Testing API Health Check...")
+    data = await _settle(_fetch_json(client, "/"))
+    print("\n🔍 Testing API Health Check...")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/")
+        if isinstance(data, Exception):
+            raise data
         
-        if response.status_code == 200:
-            data = response.json()
-            print("✅ API is running")
-            print(f"  - Patent corpus loaded: {data.get('patent_corpus_loaded', False)}")
-            print(f"  - Web search available: {data.get('web_search_available', False)}")
-            return True
-        else:
-            print(f"❌ API health check failed: {response.status_code}")
-            return False
+        print("✅ API is running")
+        print(f"  - Patent corpus loaded: {data.get('patent_corpus_loaded', False)}")
+        print(f"  - Web search available: {data.get('web_search_available', False)}")
+        return True
             
-    except requests.exceptions.ConnectionError:
+    except httpx.HTTPStatusError as e:
+        print(f"❌ API health check failed: {e.response.status_code}")
+        return False
+    except httpx.ConnectError:
         print("❌ Cannot connect to API. Make sure the server is running on port 8001")
         return False
     except Exception as e:
         print(f"❌ Error testing API health: {e}")
         return False
 
-def test_patent_status():
+async def check_patent_status(client: httpx.AsyncClient):
     """Test the patent status endpoint."""
+    data = await _settle(_fetch_json(client, "/patent/status"))
     print("\n📊 Testing Patent Status...")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/patent/status")
+        if isinstance(data, Exception):
+            raise data
         
-        if response.status_code == 200:
-            data = response.json()
-            print("✅ Patent status retrieved")
-            print(f"  - Corpus loaded: {data.get('patent_corpus_loaded', False)}")
-            print(f"  - Corpus chunks: {data.get('corpus_chunks', 0)}")
-            print(f"  - Web search available: {data.get('web_search_available', False)}")
-            print(f"  - API keys configured: {data.get('api_keys_configured', {})}")
-            return True
-        else:
-            print(f"❌ Patent status failed: {response.status_code}")
-            return False
+        print("✅ Patent status retrieved")
+        print(f"  - Corpus loaded: {data.get('patent_corpus_loaded', False)}")
+        print(f"  - Corpus chunks: {data.get('corpus_chunks', 0)}")
+        print(f"  - Web search available: {data.get('web_search_available', False)}")
+        print(f"  - API keys configured: {data.get('api_keys_configured', {})}")
+        return True
             
+    except httpx.HTTPStatusError as e:
+        print(f"❌ Patent status failed: {e.response.status_code}")
+        return False
     except Exception as e:
         print(f"❌ Error testing patent status: {e}")
         return False
 
-def test_local_search():
+async def check_local_search(client: httpx.AsyncClient):
     """Test the local patent search endpoint."""
+    params = {
+        "query": "patent application process",
+        "max_results": 3
+    }
+    response = await _settle(client.get("/patent/search-local", params=params))
     print("\n🔍 Testing Local Patent Search...")
     
     try:
-        params = {
-            "query": "patent application process",
-            "max_results": 3
-        }
-        
-        response = requests.get(f"{API_BASE_URL}/patent/search-local", params=params)
+        if isinstance(response, Exception):
+            raise response
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             results = data.get('results', [])
             print(f"✅ Local search successful - found {len(results)} results")
             
@@ -93,10 +197,8 @@ def test_local_search():
         print(f"❌ Error testing local search: {e}")
         return False
 
-def test_patent_similarity_search():
-    """Test the main patent similarity search endpoint."""
-    print("\n🎯 Testing Patent Similarity Search...")
-    
+async def check_patent_similarity_search(client: httpx.AsyncClient):
+    """Test the main patent similarity search endpoint, sending all test cases concurrently."""
     test_cases = [
         {
             "description": "A method for processing digital images using machine learning algorithms to detect objects and classify them into categories",
@@ -115,50 +217,98 @@ def test_patent_similarity_search():
         }
     ]
     
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\n  Test Case {i}: {test_case['description'][:60]}...")
+    results = await asyncio.gather(
+        *(_post_search(client, test_case) for test_case in test_cases),
+        return_exceptions=True
+    )
+    print("\n🎯 Testing Patent Similarity Search...")
+    
+    for i, (test_case, data) in enumerate(zip(test_cases, results), 1):
+        # Each case's report is assembled first and written to stdout in one call
+        lines = [f"\n  Test Case {i}: {test_case['description'][:60]}..."]
         
         try:
-            response = requests.post(
-                f"{API_BASE_URL}/patent/search",
-                json=test_case,
-                headers={"Content-Type": "application/json"}
-            )
+            if isinstance(data, Exception):
+                raise data
             
-            if response.status_code == 200:
-                data = response.json()
-                print(f"  ✅ Search successful")
-                print(f"    - Local results: {data.get('local_results_count', 0)}")
-                print(f"    - Web results: {data.get('web_results_count', 0)}")
-                print(f"    - Total results: {data.get('total_results', 0)}")
-                print(f"    - Summary: {data.get('search_summary', '')}")
-                
-                # Show top result
-                similar_patents = data.get('similar_patents', [])
-                if similar_patents:
-                    top_result = similar_patents[0]
-                    print(f"    - Top result: {top_result.get('title', 'Unknown')[:50]}...")
-                    print(f"    - Source type: {top_result.get('result_type', 'Unknown')}")
-                    if top_result.get('similarity_score'):
-                        print(f"    - Similarity: {top_result.get('similarity_score', 0):.3f}")
-                
-            else:
-                print(f"  ❌ Search failed: {response.status_code}")
-                print(f"    Response: {response.text}")
-                return False
+            lines += [
+                f"  ✅ Search successful",
+                f"    - Local results: {data.get('local_results_count', 0)}",
+                f"    - Web results: {data.get('web_results_count', 0)}",
+                f"    - Total results: {data.get('total_results', 0)}",
+                f"    - Summary: {data.get('search_summary', '')}"
+            ]
+            
+            # Show top result
+            similar_patents = data.get('similar_patents', [])
+            if similar_patents:
+                top_result = similar_patents[0]
+                lines.append(f"    - Top result: {top_result.get('title', 'Unknown')[:50]}...")
+                lines.append(f"    - Source type: {top_result.get('result_type', 'Unknown')}")
+                if top_result.get('similarity_score'):
+                    lines.append(f"    - Similarity: {top_result.get('similarity_score', 0):.3f}")
                 
+        except httpx.HTTPStatusError as e:
+            lines.append(f"  ❌ Search failed: {e.response.status_code}")
+            lines.append(f"    Response: {e.response.text}")
+            return False
         except Exception as e:
-            print(f"  ❌ Error in test case {i}: {e}")
+            lines.append(f"  ❌ Error in test case {i}: {e}")
             return False
+        finally:
+            sys.stdout.write("\n".join(lines) + "\n")
     
     return True
 
-def test_api_documentation():
+async def check_patent_search_stream(client: httpx.AsyncClient):
+    """Test the streamed search: patent lines first, then one summary line that accounts for them."""
+    payload = {
+        "description": "A wearable device that monitors heart rate and predicts arrhythmia with a neural network",
+        "use_web_search": True,
+        "use_local_corpus": True,
+        "max_local_results": 3,
+        "max_web_results": 3
+    }
+    records = await _settle(_read_stream(client, payload))
+    print("\n🌊 Testing Streamed Patent Search...")
+    
+    try:
+        if isinstance(records, Exception):
+            raise records
+        if not records:
+            raise ValueError("empty stream")
+        
+        *patents, final = records
+        if "error" in final:
+            print(f"❌ Streamed search failed: {final['error']}")
+            return False
+        if any("result_type" not in patent for patent in patents) or "result_type" in final:
+            print("❌ Streamed search sent records out of order")
+            return False
+        
+        expected = final.get('local_results_count', 0) + final.get('web_results_count', 0)
+        if len(patents) != expected:
+            print(f"❌ Streamed {len(patents)} patents, summary counts {expected}")
+            return False
+        
+        print(f"✅ Streamed search successful - {len(patents)} patents before the summary line")
+        return True
+        
+    except httpx.HTTPStatusError as e:
+        print(f"❌ Streamed search failed: {e.response.status_code}")
+        return False
+    except Exception as e:
+        print(f"❌ Error testing streamed search: {e}")
+        return False
+
+async def check_api_documentation(client: httpx.AsyncClient):
     """Test if API documentation is accessible."""
+    response = await _settle(client.head("/docs", follow_redirects=True))
     print("\n📚 Testing API Documentation...")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/docs")
+        if isinstance(response, Exception):
+            raise response
         
         if response.status_code == 200:
             print("✅ API documentation is accessible at /docs")
@@ -193,44 +343,42 @@ def interactive_patent_search():
         title = title if title else None
         
         try:
-            search_request = {
-                "description": description,
-                "title": title,
-                "use_web_search": True,
-                "use_local_corpus": True,
-                "max_local_results": 3,
-                "max_web_results": 3
-            }
-            
             print("🔄 Searching for similar patents...")
             
-            response = requests.post(
-                f"{API_BASE_URL}/patent/search",
-                json=search_request,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"\n📋 Found similar patents:")
-                print(f"Local corpus: {data.get('local_results_count', 0)} results")
-                print(f"Web search: {data.get('web_results_count', 0)} results")
-                print("-" * 60)
+            # Patents print as they arrive, each written to stdout in one call;
+            # the final record carries the counts
+            patent_count = 0
+            for patent in _stream_search(description, title):
+                if "error" in patent:
+                    print(f"❌ Search error: {patent['error']}")
+                    continue
+                if "result_type" not in patent:
+                    sys.stdout.write(
+                        f"\nLocal corpus: {patent.get('local_results_count', 0)} results\n"
+                        f"Web search: {patent.get('web_results_count', 0)} results\n"
+                    )
+                    continue
                 
-                for i, patent in enumerate(data.get('similar_patents', [])[:5], 1):
-                    print(f"\n{i}. {patent.get('title', 'Unknown Title')}")
-                    print(f"   Type: {patent.get('result_type', 'Unknown')}")
-                    if patent.get('similarity_score'):
-                        print(f"   Similarity: {patent.get('similarity_score', 0):.3f}")
-                    if patent.get('patent_number'):
-                        print(f"   Patent #: {patent.get('patent_number')}")
-                    print(f"   Description: {patent.get('description', '')[:150]}...")
-                    print(f"   Source: {patent.get('source', 'Unknown')[:50]}...")
+                lines = []
+                if patent_count == 0:
+                    lines += [f"\n📋 Found similar patents:", "-" * 60]
+                patent_count += 1
+                if patent_count > 5:
+                    continue
                 
-            else:
-                print(f"❌ Search failed: {response.status_code}")
-                print(f"Error: {response.text}")
+                lines.append(f"\n{patent_count}. {patent.get('title', 'Unknown Title')}")
+                lines.append(f"   Type: {patent.get('result_type', 'Unknown')}")
+                if patent.get('similarity_score'):
+                    lines.append(f"   Similarity: {patent.get('similarity_score', 0):.3f}")
+                if patent.get('patent_number'):
+                    lines.append(f"   Patent #: {patent.get('patent_number')}")
+                lines.append(f"   Description: {patent.get('description', '')[:150]}...")
+                lines.append(f"   Source: {patent.get('source', 'Unknown')[:50]}...")
+                sys.stdout.write("\n".join(lines) + "\n")
                 
+        except httpx.HTTPStatusError as e:
+            print(f"❌ Search failed: {e.response.status_code}")
+            print(f"Error: {e.response.text}")
         except Exception as e:
             print(f"❌ Search error: {e}")
 
@@ -272,49 +420,40 @@ def show_usage_examples():
         print(f"\n📋 {example['title']}")
         print(f"   Endpoint: {example['endpoint']}")
         if example['payload']:
-            print(f"   Payload: {json.dumps(example['payload'], indent=2)}")
+            print(f"   Payload: {orjson.dumps(example['payload'], option=orjson.OPT_INDENT_2).decode()}")
         print()
 
-def main():
-    """Main test function."""
-    print("🧪 Patent Search API Test Suite")
-    print("=" * 50)
-    
-    # Parse command line arguments
-    import sys
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'interactive':
-            interactive_patent_search()
-            return
-        elif sys.argv[1] == 'examples':
-            show_usage_examples()
-            return
-        elif sys.argv[1] == 'quick':
-            # Quick test - just health check and status
-            success = test_api_health() and test_patent_status()
-            print(f"\n🎯 Quick test: {'✅ PASSED' if success else '❌ FAILED'}")
-            return
-    
-    # Run full test suite
-    test_results = []
-    
+async def run_quick_check() -> bool:
+    """Health check followed by the status check."""
+    async with _async_client() as client:
+        return await check_api_health(client) and await check_patent_status(client)
+
+async def run_test_suite() -> List[bool]:
+    """Run the six endpoint tests concurrently over one client, in summary order."""
+    async with _async_client() as client:
+        results = await asyncio.gather(
+            check_api_health(client),
+            check_patent_status(client),
+            check_local_search(client),
+            check_patent_similarity_search(client),
+            check_patent_search_stream(client),
+            check_api_documentation(client),
+            return_exceptions=True
+        )
+    return [result is True for result in results]
+
+def run_quick():
+    """Quick test - just health check and status."""
+    success = asyncio.run(run_quick_check())
+    print(f"\n🎯 Quick test: {'✅ PASSED' if success else '❌ FAILED'}")
+    return success
+
+def run_full_suite():
+    """Run the full test suite and print a summary."""
+    # Each test reports as soon as its requests complete
     print("🏁 Starting test suite...")
-    print()
     
-    # Test 1: API Health
-    test_results.append(test_api_health())
-    
-    # Test 2: Patent Status
-    test_results.append(test_patent_status())
-    
-    # Test 3: Local Search
-    test_results.append(test_local_search())
-    
-    # Test 4: Patent Similarity Search
-    test_results.append(test_patent_similarity_search())
-    
-    # Test 5: API Documentation
-    test_results.append(test_api_documentation())
+    test_results = asyncio.run(run_test_suite())
     
     # Summary
     print("\n" + "=" * 50)
@@ -329,6 +468,7 @@ def main():
         "Patent Status",
         "Local Search",
         "Patent Similarity Search",
+        "Streamed Patent Search",
         "API Documentation"
     ]
     
@@ -353,6 +493,35 @@ def main():
     
     return passed == total
 
+# Command line modes; anything else runs the full suite
+COMMANDS = {
+    "interactive": interactive_patent_search,
+    "examples": show_usage_examples,
+    "quick": run_quick,
+}
+
+# Modes that send requests through the blocking CLIENT; the others use their own
+# async client or make no requests
+SYNC_CLIENT_COMMANDS = {"interactive"}
+
+def main():
+    """Main test function."""
+    global CLIENT
+    print("🧪 Patent Search API Test Suite")
+    print("=" * 50)
+    
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    run = COMMANDS.get(command, run_full_suite)
+    if command not in SYNC_CLIENT_COMMANDS:
+        return run()
+    
+    CLIENT = _sync_client()
+    try:
+        return run()
+    finally:
+        CLIENT.close()
+        CLIENT = None
+
 if __name__ == "__main__":
     success = main()
     exit(0 if success else 1)
@@ -6,19 +6,39 @@ local document embeddings, and Exa web search.
 """
 
 import os
+import re
+import copy
+import time
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import (
+    List,
+    Dict,
+    Any,
+    Optional,
+    Set,
+    Tuple,
+    AsyncIterator,
+    Iterator,
+    Union,
+)
 from contextlib import asynccontextmanager
 
+import httpx
+import numpy as np
+import orjson
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 import anthropic
-from exa_py import Exa
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
-from legal_doc_processor import LegalRAGRetriever
+from legal_doc_processor import LegalRAGRetriever, truncate_tokens
 
 # Load environment variables
 load_dotenv()
@@ -27,7 +47,67 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variables for loaded models
+# Exact-match cache for /legal/chat responses, checked before embedding the question
+EXACT_CACHE_SIZE = 10_000
+EXACT_CACHE_TTL = 3600
+
+# Semantic cache for /legal/chat responses
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LEGAL_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("LEGAL_CACHE_SIZE", "256"))
+SEMANTIC_CACHE_TTL = float(os.getenv("LEGAL_CACHE_TTL", "3600"))
+
+# Cache of Exa results per (legal_query, max_results); kept short since web
+# results change, but outlives answer cache invalidations on reload
+WEB_CACHE_SIZE = 1024
+WEB_CACHE_TTL = 300
+
+EXA_SEARCH_URL = "https://api.exa.ai/search"
+
+# Marker after which the answer call appends its per-chunk summaries
+SUMMARIES_OPEN = "<summaries>"
+SUMMARIES_CLOSE = "</summaries>"
+
+# Below this many local chunks, or when all are shorter than SUMMARY_MIN_CHARS,
+# summaries are the chunks' first sentences instead of LLM output
+SUMMARY_MIN_CHUNKS = 3
+SUMMARY_MIN_CHARS = 400
+# Bounded so text without sentence punctuation fails fast instead of being
+# scanned to the end
+FIRST_SENTENCE_RE = re.compile(r"[^.!?]{1,300}[.!?]")
+
+# (max words, local results, web results) for queries that left the result
+# counts at their defaults; shorter questions get fewer sources
+ADAPTIVE_RESULT_LIMITS = ((5, 1, 1), (15, 3, 2))
+
+# Token budgets for source content in the Claude context, overall and per source
+CONTEXT_MAX_TOKENS = 3500
+SOURCE_MAX_TOKENS = 500
+
+# Retrieval tools Claude may call before answering. The calls only select
+# sources, which are searched with the original question; questions that need
+# no sources are answered directly
+RETRIEVAL_TOOLS = {
+    "search_local": {
+        "name": "search_local",
+        "description": (
+            "Search the local library of statutes, codes and legal reference texts. "
+            "Use for questions about the content of specific laws or legal rules."
+        ),
+        "input_schema": {"type": "object", "properties": {}},
+    },
+    "search_web": {
+        "name": "search_web",
+        "description": (
+            "Search the web for legal sources. Use for current law, recent changes, "
+            "case law or jurisdiction-specific questions."
+        ),
+        "input_schema": {"type": "object", "properties": {}},
+    },
+}
+
+# Global variables for loaded models. legal_retriever is only ever rebound,
+# never mutated: handlers read it once per request and keep using that object,
+# so a reload never blocks or tears an in-flight search
 legal_retriever: Optional[LegalRAGRetriever] = None
 
 
@@ -39,7 +119,9 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Loading legal knowledge base...")
     try:
-        legal_retriever = LegalRAGRetriever("legal_knowledge_base.pkl")
+        legal_retriever = await asyncio.to_thread(
+            LegalRAGRetriever, "legal_knowledge_base.pkl"
+        )
         logger.info("Legal knowledge base loaded successfully")
     except FileNotFoundError:
         logger.warning(
@@ -54,6 +136,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down legal chat API")
+    await http_client.aclose()
 
 
 app = FastAPI(
@@ -61,6 +144,7 @@ app = FastAPI(
     description="Legal question answering with RAG and web search",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -72,9 +156,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared HTTP/2 connection pool for Anthropic and Exa
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+    timeout=60,
+)
+
 # Initialize clients
-anthropic_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-exa_client = Exa(api_key=os.getenv("EXA_API_KEY"))
+anthropic_client = anthropic.AsyncAnthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=http_client
+)
 
 
 # Pydantic models
@@ -102,27 +194,152 @@ class ContextSource(BaseModel):
     relevance_score: Optional[float] = None
 
 
+class SemanticCache:
+    """
+    Recent legal chat answers, found again by the meaning of the question.
+
+    An answer is reused for a new question asked with the same LegalQuery
+    options when the two question embeddings reach the cosine threshold. Each
+    answer lives for ttl seconds, and the entry used longest ago goes first
+    once capacity is exceeded.
+    """
+
+    def __init__(self, threshold: float, capacity: int, ttl: float):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        # entry id -> (unit question vector, LegalQuery options, stored at, answer)
+        self._entries: OrderedDict = OrderedDict()
+        self._next_id = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def normalize(embedding: Union[List[float], np.ndarray]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector: np.ndarray, params: Tuple) -> Optional[LegalResponse]:
+        """Best-matching live answer for the question vector, or None below the threshold."""
+        now = time.monotonic()
+        best_id: Optional[int] = None
+        best_score = self.threshold
+
+        for entry_id, (cached, cached_params, created_at, _) in list(
+            self._entries.items()
+        ):
+            if now - created_at > self.ttl:
+                del self._entries[entry_id]
+                continue
+            if cached_params != params:
+                continue
+            score = float(cached @ vector)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            return None
+
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][3]
+
+    async def store(
+        self, vector: np.ndarray, params: Tuple, response: LegalResponse
+    ) -> None:
+        async with self._lock:
+            self._entries[self._next_id] = (vector, params, time.monotonic(), response)
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def extract_first_sentence(text: str) -> str:
+    """Return the first sentence of text, or its first 120 characters."""
+    match = FIRST_SENTENCE_RE.match(text)
+    return (match.group() if match else text[:120]).strip()
+
+
+def cached_system(prompt: str) -> List[Dict[str, Any]]:
+    """System prompt as a content block marked for Anthropic prompt caching."""
+    return [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def pick_k(query: str) -> Tuple[int, int]:
+    """Pick (max_local_results, max_web_results) from the query length."""
+    words = len(query.split())
+    for max_words, local_k, web_k in ADAPTIVE_RESULT_LIMITS:
+        if words <= max_words:
+            return local_k, web_k
+    # Longer questions keep the LegalQuery defaults
+    fields = LegalQuery.model_fields
+    return fields["max_local_results"].default, fields["max_web_results"].default
+
+
 class LegalChatService:
     """Service for handling legal chat queries with RAG and web search."""
 
     def __init__(self):
+        self.exact_cache: TTLCache = TTLCache(
+            maxsize=EXACT_CACHE_SIZE, ttl=EXACT_CACHE_TTL
+        )
+        self.semantic_cache = SemanticCache(
+            SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL
+        )
+        self.web_cache: TTLCache = TTLCache(maxsize=WEB_CACHE_SIZE, ttl=WEB_CACHE_TTL)
+        # One lock per in-flight web query so identical concurrent searches
+        # share a single Exa call
+        self._web_locks: Dict[Tuple[str, int], asyncio.Lock] = {}
         self.max_context_length = 15000  # Characters for context
-        self.system_prompt = """You are a highly knowledgeable legal assistant.
+        self.max_context_tokens = CONTEXT_MAX_TOKENS  # Tokens of source content
+        self.system_prompt = f"""You are a highly knowledgeable legal assistant.
 
-Write a single, cohesive paragraph that directly answers the user's question using only the provided CONTEXT. Do not include citations, lists, headings, or references; use neutral, clear prose similar to the concise summary shown at the top of a Google Search result. If the context is insufficient, note the specific missing information in the same paragraph. Keep it 3–6 sentences, accurate, and accessible to non-lawyers. Always end the paragraph with: This is informational and not legal advice."""
+Write a single, cohesive paragraph that directly answers the user's question using only the provided CONTEXT. The paragraph must not include citations, lists, headings, or references; use neutral, clear prose similar to the concise summary shown at the top of a Google Search result. If the context is insufficient, note the specific missing information in the same paragraph. Keep it 3–6 sentences, accurate, and accessible to non-lawyers. Always end the paragraph with: This is informational and not legal advice.
+
+When the user asks for source summaries, add them after the paragraph as a separate machine-readable block that is not shown as part of the answer: on a new line, write {SUMMARIES_OPEN} followed by a JSON array with one object per requested LOCAL SOURCE, each with fields id (the source number) and summary (a single sentence, max 30 words, capturing its key legal point(s)), then {SUMMARIES_CLOSE}. Write nothing after it."""
+        self.system_blocks = cached_system(self.system_prompt)
+        # Fixed parts of the answer prompt, joined around the per-request values
+        self._gen_prefix = "You will receive LOCAL and WEB sources.\n\nUSER QUESTION:\n"
+        self._gen_middle = "\n\nCONTEXT:\n"
+        self._gen_suffix = "\n\nWrite a single-paragraph summary that answers the question. The paragraph has no citations, lists, headings or references. If context is insufficient, state what is missing within the same paragraph. End with the exact sentence: This is informational and not legal advice."
+        self._summaries_prefix = "\n\nThen add the source summaries block for LOCAL SOURCES 1 to "
+        self._summaries_suffix = "."
+        self.routing_prompt = """You are a highly knowledgeable legal assistant with search tools.
+
+Call the tools whose sources are needed to answer the user's question accurately, calling several at once when useful. If the question is small talk or a general legal definition you can answer reliably without sources, do not call any tool; instead write a single, cohesive paragraph of 3–6 sentences in neutral, clear prose without citations, lists or headings, ending with: This is informational and not legal advice."""
+        self.routing_blocks = cached_system(self.routing_prompt)
 
     async def get_local_context(
-        self, query: str, max_results: int = 5
-    ) -> List[Dict[str, Any]]:
-        """Retrieve relevant context from local legal documents."""
-        if not legal_retriever:
+        self,
+        query: str,
+        max_results: int = 5,
+        query_embedding: Optional[np.ndarray] = None,
+        retriever: Optional[LegalRAGRetriever] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Retrieve relevant context from local legal documents.
+
+        retriever is the snapshot of legal_retriever taken by the caller; the
+        current one is used when it is not given. Returns None if the search
+        failed.
+        """
+        retriever = retriever or legal_retriever
+        if not retriever:
             logger.warning("Legal retriever not available")
             return []
 
         try:
-            similar_chunks = legal_retriever.search_similar_chunks(
-                query, top_k=max_results
-            )
+            if query_embedding is not None:
+                similar_chunks = await asyncio.to_thread(
+                    retriever.search_similar_chunks_by_vector,
+                    query_embedding,
+                    top_k=max_results,
+                )
+            else:
+                similar_chunks = await asyncio.to_thread(
+                    retriever.search_similar_chunks, query, top_k=max_results
+                )
 
             local_context = []
             for chunk in similar_chunks:
@@ -140,216 +357,456 @@ Write a single, cohesive paragraph that directly answers the user's question usi
             return local_context
         except Exception as e:
             logger.error(f"Error retrieving local context: {e}")
-            return []
+            return None
 
     async def get_web_context(
         self, query: str, max_results: int = 3
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Retrieve relevant context from web search using Exa; None on failure."""
+        # Enhance query for legal search
+        legal_query = f"legal {query} law statute regulation case"
+        cache_key = (legal_query, max_results)
+
+        cached = self.web_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        lock = self._web_locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            try:
+                # A concurrent identical query may have filled the cache
+                cached = self.web_cache.get(cache_key)
+                if cached is not None:
+                    return copy.deepcopy(cached)
+
+                web_context = await self._search_web(legal_query, max_results)
+                self.web_cache[cache_key] = web_context
+                return copy.deepcopy(web_context)
+            except Exception as e:
+                logger.error(f"Error retrieving web context: {e}")
+                return None
+            finally:
+                # Waiters already hold the lock object and will hit the cache
+                if self._web_locks.get(cache_key) is lock:
+                    del self._web_locks[cache_key]
+
+    async def _search_web(
+        self, legal_query: str, max_results: int
     ) -> List[Dict[str, Any]]:
-        """Retrieve relevant context from web search using Exa."""
-        try:
-            # Enhance query for legal search
-            legal_query = f"legal {query} law statute regulation case"
-
-            search_results = exa_client.search_and_contents(
-                query=legal_query,
-                num_results=max_results,
-                text=True,
-                highlights=True,
-                summary=True,
-            )
+        """Run one Exa search and convert its results to context entries."""
+        # Call the Exa REST API on the shared connection pool
+        resp = await http_client.post(
+            EXA_SEARCH_URL,
+            headers={"x-api-key": os.getenv("EXA_API_KEY")},
+            json={
+                "query": legal_query,
+                "numResults": max_results,
+                "contents": {"text": True, "highlights": True, "summary": True},
+            },
+        )
+        resp.raise_for_status()
 
-            web_context = []
-            for result in search_results.results:
-                # Extract highlights or use summary/text
-                content = ""
-                if hasattr(result, "highlights") and result.highlights:
-                    content = " ".join(result.highlights)
-                elif hasattr(result, "summary") and result.summary:
-                    content = result.summary
-                elif hasattr(result, "text") and result.text:
-                    content = result.text[:1000]  # Limit length
-
-                web_context.append(
-                    {
-                        "type": "web",
-                        "title": result.title,
-                        "content": content,
-                        "source": result.url,
-                        "relevance_score": result.score
-                        if hasattr(result, "score")
-                        else None,
-                    }
-                )
+        web_context = []
+        for result in resp.json().get("results", []):
+            # Extract highlights or use summary/text
+            content = ""
+            if result.get("highlights"):
+                content = " ".join(result["highlights"])
+            elif result.get("summary"):
+                content = result["summary"]
+            elif result.get("text"):
+                content = result["text"][:1000]  # Limit length
+
+            web_context.append(
+                {
+                    "type": "web",
+                    "title": result.get("title") or "",
+                    "content": content,
+                    "source": result.get("url") or "",
+                    "relevance_score": result.get("score"),
+                }
+            )
 
-            return web_context
-        except Exception as e:
-            logger.error(f"Error retrieving web context: {e}")
-            return []
+        return web_context
 
-    def format_context(self, local_context: List[Dict], web_context: List[Dict]) -> str:
-        """Format context for Claude prompt."""
-        context_parts = []
+    def _context_lines(
+        self, local_context: List[Dict], web_context: List[Dict]
+    ) -> Iterator[str]:
+        """Yield the lines of the Claude context, lazily.
 
-        if local_context:
-            context_parts.append("=== LOCAL LEGAL DOCUMENTS ===")
+        Source content is cut on token boundaries to SOURCE_MAX_TOKENS each and
+        max_context_tokens overall; sources past the budget are left out.
+        """
+        remaining = self.max_context_tokens
+
+        def content_line(ctx: Dict) -> str:
+            nonlocal remaining
+            limit = min(SOURCE_MAX_TOKENS, remaining)
+            # Local chunks carry their token count from indexing
+            count = ctx.get("metadata", {}).get("token_count")
+            if count is not None and count <= limit:
+                text, used = ctx["content"], count
+            else:
+                text, used = truncate_tokens(ctx["content"], limit)
+            remaining -= used
+            if len(text) < len(ctx["content"]):
+                return f"Content: {text}..."
+            return f"Content: {text}"
+
+        if local_context and remaining > 0:
+            yield "=== LOCAL LEGAL DOCUMENTS ==="
             for i, ctx in enumerate(local_context, 1):
-                context_parts.append(f"\n[LOCAL SOURCE {i}] {ctx['title']}")
-                context_parts.append(f"Relevance: {ctx['relevance_score']:.3f}")
-                context_parts.append(
-                    f"Content: {ctx['content'][:2000]}..."
-                )  # Limit content length
-                context_parts.append("---")
-
-        if web_context:
-            context_parts.append("\n=== WEB SOURCES ===")
+                if remaining <= 0:
+                    break
+                yield f"\n[LOCAL SOURCE {i}] {ctx['title']}"
+                yield f"Relevance: {ctx['relevance_score']:.3f}"
+                yield content_line(ctx)
+                yield "---"
+
+        if web_context and remaining > 0:
+            yield "\n=== WEB SOURCES ==="
             for i, ctx in enumerate(web_context, 1):
-                context_parts.append(f"\n[WEB SOURCE {i}] {ctx['title']}")
-                context_parts.append(f"URL: {ctx['source']}")
-                context_parts.append(
-                    f"Content: {ctx['content'][:2000]}..."
-                )  # Limit content length
-                context_parts.append("---")
+                if remaining <= 0:
+                    break
+                yield f"\n[WEB SOURCE {i}] {ctx['title']}"
+                yield f"URL: {ctx['source']}"
+                yield content_line(ctx)
+                yield "---"
 
-        full_context = "\n".join(context_parts)
-
-        # Truncate if too long
-        if len(full_context) > self.max_context_length:
-            full_context = (
-                full_context[: self.max_context_length] + "\n[CONTEXT TRUNCATED]"
-            )
+    def format_context(self, local_context: List[Dict], web_context: List[Dict]) -> str:
+        """Format context for Claude prompt, truncated to max_context_length."""
+        context_parts: List[str] = []
+        remaining = self.max_context_length
+        truncated = False
+
+        # Stop formatting sources as soon as the budget is spent instead of
+        # building the full context and slicing it
+        for line in self._context_lines(local_context, web_context):
+            if context_parts:
+                remaining -= 1  # "\n" separator
+                if remaining < 0:
+                    truncated = True
+                    break
+            if len(line) > remaining:
+                context_parts.append(line[:remaining])
+                truncated = True
+                break
+            context_parts.append(line)
+            remaining -= len(line)
 
+        full_context = "\n".join(context_parts)
+        if truncated:
+            full_context += "\n[CONTEXT TRUNCATED]"
         return full_context
 
-    async def generate_legal_response(self, query: str, context: str) -> str:
-        """Generate legal response using Claude Sonnet 3.5."""
-        try:
-            prompt = f"""You will receive LOCAL and WEB sources.
-
-USER QUESTION:
-{query}
+    async def stream_legal_response(
+        self, query: str, context: str, local_context: List[Dict[str, Any]]
+    ) -> AsyncIterator[Union[str, List[str]]]:
+        """Generate legal response using Claude Sonnet, streamed as text deltas.
 
-CONTEXT:
-{context}
+        When local_context is non-empty the same call also summarizes each local
+        chunk in one sentence; the summaries follow the answer after
+        SUMMARIES_OPEN and are yielded last as a list aligned with local_context.
 
-Write a single-paragraph summary that answers the question. No citations, no lists, no headings, no references. If context is insufficient, state what is missing within the same paragraph. End with the exact sentence: This is informational and not legal advice."""
+        If Claude fails, an apology (or the partial answer) is yielded as usual
+        and the error is re-raised once the summaries are out.
+        """
+        local_count = len(local_context)
+        emitted = False
+        error: Optional[Exception] = None
+        pending = ""
+        tail: Optional[str] = None
+        try:
+            parts = [self._gen_prefix, query, self._gen_middle, context, self._gen_suffix]
+            if local_count:
+                parts += [self._summaries_prefix, str(local_count), self._summaries_suffix]
+            prompt = "".join(parts)
 
-            message = anthropic_client.messages.create(
+            async with anthropic_client.messages.stream(
                 model="claude-sonnet-4-20250514",
-                max_tokens=2000,
-                system=self.system_prompt,
+                max_tokens=2500,
+                system=self.system_blocks,
                 messages=[{"role": "user", "content": prompt}],
-            )
-
-            return message.content[0].text
+            ) as stream:
+                async for text in stream.text_stream:
+                    if tail is not None:
+                        tail += text
+                        continue
+                    pending += text
+                    marker = pending.find(SUMMARIES_OPEN)
+                    if marker != -1:
+                        text = pending[:marker]
+                        tail = pending[marker + len(SUMMARIES_OPEN) :]
+                        pending = ""
+                    else:
+                        # Hold back anything that could be the start of the marker
+                        keep = len(SUMMARIES_OPEN) - 1
+                        text, pending = pending[:-keep], pending[-keep:]
+                    if text:
+                        emitted = True
+                        yield text
+            if pending:
+                emitted = True
+                yield pending
         except Exception as e:
             logger.error(f"Error generating response with Claude: {e}")
-            return "I apologize, but I encountered an error while processing your legal question. Please try again or consult with a qualified legal professional."
+            error = e
+            # Keep a partially streamed answer rather than appending an apology
+            if not emitted:
+                yield "I apologize, but I encountered an error while processing your legal question. Please try again or consult with a qualified legal professional."
+
+        if local_count:
+            yield self.parse_chunk_summaries(
+                (tail or "").split(SUMMARIES_CLOSE)[0], local_context
+            )
+        if error is not None:
+            raise error
 
-    async def summarize_local_context(
-        self, local_context: List[Dict[str, Any]]
+    def parse_chunk_summaries(
+        self, raw: str, local_context: List[Dict[str, Any]]
     ) -> List[str]:
-        """Summarize each local chunk into a single sentence via LLM.
-
-        Returns a list of summaries aligned with the order of local_context.
+        """Parse the JSON summaries array into one summary per local chunk."""
+        summaries: List[str] = [""] * len(local_context)
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            data = None
+
+        if isinstance(data, list):
+            for obj in data:
+                if not isinstance(obj, dict):
+                    continue
+                idx = obj.get("id")
+                if isinstance(idx, str) and idx.isdigit():
+                    idx = int(idx)
+                if isinstance(idx, int) and 1 <= idx <= len(summaries):
+                    summaries[idx - 1] = str(obj.get("summary", "")).strip()
+
+        # Fallback: first sentence of any chunk left without a summary
+        for i, ctx in enumerate(local_context):
+            if not summaries[i]:
+                summaries[i] = extract_first_sentence(ctx.get("content", ""))
+        return summaries
+
+    async def _route(
+        self, question: str, tools: List[Dict[str, Any]]
+    ) -> Tuple[Optional[Set[str]], Optional[str]]:
         """
-        if not local_context:
-            return []
+        Ask Claude which retrieval tools the question needs.
 
+        Returns (tool names, direct_answer). The names are None when routing
+        is unavailable, in which case every source is kept.
+        """
         try:
-            # Build compact input to control token usage
-            items = []
-            for idx, ctx in enumerate(local_context, start=1):
-                content = ctx.get("content", "")
-                # Limit each chunk content to keep prompt size manageable
-                trimmed = content[:800]
-                title = ctx.get("title", f"Local Chunk {idx}")
-                items.append(
-                    {
-                        "id": idx,
-                        "title": title,
-                        "text": trimmed,
-                    }
-                )
-
-            instruction = (
-                "You will receive a list of local legal text chunks. "
-                "For each item, produce a single-sentence summary (max 30 words) capturing the key legal point(s). "
-                "Return ONLY valid JSON array of objects with fields id and summary, no prose."
-            )
-
-            import json as _json
-
-            prompt = f"{instruction}\n\nITEMS AS JSON ARRAY:\n{_json.dumps(items, ensure_ascii=False)}"
-
-            message = anthropic_client.messages.create(
+            message = await anthropic_client.messages.create(
                 model="claude-sonnet-4-20250514",
-                max_tokens=800,
-                system=(
-                    "You are a precise assistant that returns strict JSON. "
-                    "Never include comments or explanations outside JSON."
-                ),
-                messages=[{"role": "user", "content": prompt}],
+                max_tokens=1000,
+                system=self.routing_blocks,
+                tools=tools,
+                messages=[{"role": "user", "content": question}],
             )
-
-            raw = message.content[0].text.strip()
-
-            summaries: List[str] = [""] * len(local_context)
-            try:
-                import json as _json
-
-                data = _json.loads(raw)
-                if isinstance(data, list):
-                    for obj in data:
-                        try:
-                            idx = int(obj.get("id")) - 1
-                            if 0 <= idx < len(summaries):
-                                summaries[idx] = str(obj.get("summary", "")).strip()
-                        except Exception:
-                            continue
-            except Exception:
-                # Fallback: take first sentence-ish from each content
-                for i, ctx in enumerate(local_context):
-                    txt = ctx.get("content", "")
-                    period = txt.find(".")
-                    candidate = txt[: period + 1] if period != -1 else txt[:120]
-                    summaries[i] = candidate.strip()
-
-            return summaries
         except Exception as e:
-            logger.error(f"Error summarizing local context: {e}")
-            return [""] * len(local_context)
+            logger.warning(f"Retrieval routing unavailable: {e}")
+            return None, None
+
+        called = {block.name for block in message.content if block.type == "tool_use"}
+        if called:
+            return called, None
+        answer = "".join(
+            block.text for block in message.content if block.type == "text"
+        ).strip()
+        if answer:
+            return set(), answer
+        return None, None
+
+    async def route_retrieval(
+        self,
+        query: LegalQuery,
+        query_embedding: Optional[np.ndarray],
+        retriever: Optional[LegalRAGRetriever] = None,
+    ) -> Tuple[
+        Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]], Optional[str]
+    ]:
+        """
+        Search every enabled source while Claude picks the ones it needs.
+
+        Routing runs in parallel with retrieval and only filters it: searches
+        for tools Claude did not call are cancelled. Returns (local_context,
+        web_context, direct_answer); a context is None when its search failed,
+        and direct_answer is set when Claude answered without calling any tool.
+        """
+        tools = [
+            RETRIEVAL_TOOLS[name]
+            for name, enabled in (
+                ("search_local", query.use_local_docs),
+                ("search_web", query.use_web_search),
+            )
+            if enabled
+        ]
+        if not tools:
+            return [], [], None
+
+        async with asyncio.TaskGroup() as tg:
+            local_task = (
+                tg.create_task(
+                    self.get_local_context(
+                        query.question,
+                        max_results=query.max_local_results,
+                        query_embedding=query_embedding,
+                        retriever=retriever,
+                    )
+                )
+                if query.use_local_docs
+                else None
+            )
+            web_task = (
+                tg.create_task(
+                    self.get_web_context(
+                        query.question, max_results=query.max_web_results
+                    )
+                )
+                if query.use_web_search
+                else None
+            )
+            called, direct_answer = await self._route(query.question, tools)
+            # Don't wait on searches Claude decided against
+            if called is not None:
+                if local_task is not None and "search_local" not in called:
+                    local_task.cancel()
+                    local_task = None
+                if web_task is not None and "search_web" not in called:
+                    web_task.cancel()
+                    web_task = None
+
+        local_context = local_task.result() if local_task is not None else []
+        web_context = web_task.result() if web_task is not None else []
+        return local_context, web_context, direct_answer
 
     async def process_legal_query(self, query: LegalQuery) -> LegalResponse:
         """Process a legal query with RAG and web search."""
+        async for event in self.stream_legal_query(query):
+            if isinstance(event, LegalResponse):
+                return event
+        raise RuntimeError("Legal query produced no response")
+
+    async def stream_legal_query(
+        self, query: LegalQuery
+    ) -> AsyncIterator[Union[str, LegalResponse]]:
+        """
+        Process a legal query, yielding answer text deltas as Claude streams
+        them and finally the complete LegalResponse.
+
+        Cached responses are yielded directly, without any deltas.
+        """
         logger.info(f"Processing legal query: {query.question[:100]}...")
 
-        # Gather context
-        local_context = []
-        web_context = []
+        # One knowledge base for the whole request, even if it is reloaded meanwhile
+        retriever = legal_retriever
 
-        if query.use_local_docs:
-            local_context = await self.get_local_context(
-                query.question, max_results=query.max_local_results
+        # Requests that cannot produce a grounded answer skip retrieval and Claude
+        noop: Optional[Tuple[str, str]] = None  # (answer, reasoning)
+        if not query.question.strip():
+            noop = ("Please enter a legal question.", "Question is empty")
+        elif not query.use_local_docs and not query.use_web_search:
+            noop = ("Please enable local or web search.", "No retrieval sources enabled")
+        elif not query.use_web_search and retriever is None:
+            noop = (
+                "Please enable web search; local legal documents are not loaded.",
+                "Local documents unavailable and web search disabled",
+            )
+        if noop is not None:
+            yield LegalResponse(
+                answer=noop[0],
+                sources=[],
+                local_context_used=[],
+                web_context_used=[],
+                reasoning=noop[1],
             )
-            # Summarize local chunks (one-sentence) for frontend consumption
+            return
+
+        # Size retrieval to the question unless the client chose the counts
+        local_k, web_k = pick_k(query.question)
+        adaptive = {}
+        if "max_local_results" not in query.model_fields_set:
+            adaptive["max_local_results"] = local_k
+        if "max_web_results" not in query.model_fields_set:
+            adaptive["max_web_results"] = web_k
+        if adaptive:
+            query = query.model_copy(update=adaptive)
+
+        # Repeated questions with the same options skip even the embedding call
+        cache_params = tuple(sorted(query.model_dump(exclude={"question"}).items()))
+        exact_key = hashlib.sha256(
+            f"{query.question.strip().lower()}|{cache_params}".encode()
+        ).hexdigest()
+        cached = self.exact_cache.get(exact_key)
+        if cached is not None:
+            logger.info("Exact cache hit for legal query")
+            yield cached
+            return
+
+        # Embed the question once; the semantic cache and the local search
+        # share the vector
+        query_embedding: Optional[np.ndarray] = None
+        cache_vector: Optional[np.ndarray] = None
+        if retriever:
             try:
-                summaries = await self.summarize_local_context(local_context)
-                for i, summ in enumerate(summaries):
-                    if i < len(local_context):
-                        local_context[i]["summary"] = summ
+                query_embedding = await asyncio.to_thread(
+                    retriever.embed, query.question
+                )
+                cache_vector = SemanticCache.normalize(query_embedding)
+                cached = self.semantic_cache.lookup(cache_vector, cache_params)
+                if cached is not None:
+                    logger.info("Semantic cache hit for legal query")
+                    self.exact_cache[exact_key] = cached
+                    yield cached
+                    return
             except Exception as e:
-                logger.warning(f"Local summaries unavailable: {e}")
+                logger.warning(f"Semantic cache unavailable: {e}")
 
-        if query.use_web_search:
-            web_context = await self.get_web_context(
-                query.question, max_results=query.max_web_results
+        # Search while Claude decides which sources the question needs, if any
+        local_context, web_context, direct_answer = await self.route_retrieval(
+            query, query_embedding, retriever
+        )
+        # Answer without a failed source, but keep the result out of the caches
+        cacheable = local_context is not None and web_context is not None
+        local_context = local_context or []
+        web_context = web_context or []
+        if direct_answer is not None:
+            answer = direct_answer
+            yield answer
+        else:
+            # Format context for Claude
+            formatted_context = self.format_context(local_context, web_context)
+
+            # One-sentence summaries of the local chunks for the frontend; only
+            # worth asking the LLM for when there are several substantial chunks
+            summarize = len(local_context) >= SUMMARY_MIN_CHUNKS and any(
+                len(ctx["content"]) >= SUMMARY_MIN_CHARS for ctx in local_context
             )
+            if not summarize:
+                for ctx in local_context:
+                    ctx["summary"] = extract_first_sentence(ctx["content"])
 
-        # Format context for Claude
-        formatted_context = self.format_context(local_context, web_context)
-
-        # Generate response
-        answer = await self.generate_legal_response(query.question, formatted_context)
+            # Generate response, passing text through as it streams; the same call
+            # returns the chunk summaries when requested
+            parts: List[str] = []
+            try:
+                async for event in self.stream_legal_response(
+                    query.question,
+                    formatted_context,
+                    local_context if summarize else [],
+                ):
+                    if isinstance(event, str):
+                        parts.append(event)
+                        yield event
+                    else:
+                        for ctx, summ in zip(local_context, event):
+                            ctx["summary"] = summ
+            except Exception:
+                # The apology or partial answer has already been streamed
+                cacheable = False
+            answer = "".join(parts).strip()
 
         # Prepare sources
         all_sources = []
@@ -367,7 +824,7 @@ Write a single-paragraph summary that answers the question. No citations, no lis
                 }
             )
 
-        return LegalResponse(
+        response = LegalResponse(
             answer=answer,
             sources=all_sources,
             local_context_used=local_context,
@@ -375,6 +832,15 @@ Write a single-paragraph summary that answers the question. No citations, no lis
             reasoning=f"Used {len(local_context)} local sources and {len(web_context)} web sources",
         )
 
+        # Don't cache failed or degraded answers, or ones built from a
+        # knowledge base replaced mid-request
+        if cacheable and retriever is legal_retriever:
+            self.exact_cache[exact_key] = response
+            if cache_vector is not None:
+                await self.semantic_cache.store(cache_vector, cache_params, response)
+
+        yield response
+
 
 # Initialize service
 legal_service = LegalChatService()
@@ -399,23 +865,61 @@ async def legal_chat(query: LegalQuery):
             raise HTTPException(status_code=400, detail="Question cannot be empty")
 
         response = await legal_service.process_legal_query(query)
-        return response
+        # The response was validated when built (cache hits are the same stored
+        # objects), so skip FastAPI's second validation against response_model
+        return ORJSONResponse(response.model_dump())
 
     except Exception as e:
         logger.error(f"Error in legal chat: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Format one server-sent event with an orjson-encoded payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@app.post("/legal/chat/stream")
+async def legal_chat_stream(query: LegalQuery):
+    """
+    Same as /legal/chat, streamed as server-sent events.
+
+    Answer text arrives as "delta" events while Claude generates it, followed by
+    a single "done" event carrying the rest of the response (sources, context
+    used, reasoning). A cached response is sent as one delta plus "done".
+    """
+    if not query.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    async def _events():
+        streamed = False
+        try:
+            async for event in legal_service.stream_legal_query(query):
+                if isinstance(event, LegalResponse):
+                    if not streamed:
+                        yield _sse("delta", {"text": event.answer})
+                    yield _sse("done", event.model_dump(exclude={"answer"}))
+                else:
+                    streamed = True
+                    yield _sse("delta", {"text": event})
+        except Exception as e:
+            logger.error(f"Error in legal chat stream: {e}")
+            yield _sse("error", {"detail": f"Internal server error: {e}"})
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
 @app.get("/legal/status")
 async def legal_status():
     """Get system status."""
+    retriever = legal_retriever
     return {
-        "legal_retriever_loaded": legal_retriever is not None,
-        "total_chunks": len(legal_retriever.chunks) if legal_retriever else 0,
+        "legal_retriever_loaded": retriever is not None,
+        "total_chunks": len(retriever.chunks) if retriever else 0,
         "documents": [
-            doc["document_name"] for doc in legal_retriever.knowledge_base["documents"]
+            doc["document_name"] for doc in retriever.knowledge_base["documents"]
         ]
-        if legal_retriever
+        if retriever
         else [],
         "anthropic_configured": bool(os.getenv("ANTHROPIC_API_KEY")),
         "exa_configured": bool(os.getenv("EXA_API_KEY")),
@@ -427,7 +931,14 @@ async def reload_legal_kb():
     """Reload the legal knowledge base."""
     global legal_retriever
     try:
-        legal_retriever = LegalRAGRetriever("legal_knowledge_base.pkl")
+        # Load off the event loop, then publish with a single rebind; requests
+        # still holding the old retriever finish with it
+        new_retriever = await asyncio.to_thread(
+            LegalRAGRetriever, "legal_knowledge_base.pkl"
+        )
+        legal_retriever = new_retriever
+        legal_service.exact_cache.clear()
+        legal_service.semantic_cache.clear()
         return {"message": "Legal knowledge base reloaded successfully"}
     except Exception as e:
         raise HTTPException(
@@ -438,11 +949,14 @@ async def reload_legal_kb():
 @app.get("/legal/search")
 async def search_legal_docs(query: str, max_results: int = 5):
     """Search local legal documents only."""
-    if not legal_retriever:
+    retriever = legal_retriever
+    if not retriever:
         raise HTTPException(status_code=503, detail="Legal knowledge base not loaded")
 
     try:
-        results = legal_retriever.search_similar_chunks(query, top_k=max_results)
+        results = await asyncio.to_thread(
+            retriever.search_similar_chunks, query, top_k=max_results
+        )
         return {"query": query, "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
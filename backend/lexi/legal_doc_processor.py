@@ -6,17 +6,46 @@ Processes PDF legal documents, creates embeddings, and saves to pickle files.
 
 import os
 import re
+import random
+import asyncio
 import pickle
+import sqlite3
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Tuple
 from pathlib import Path
 from datetime import datetime
 import PyPDF2
 import openai
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
 # Load environment variables
 load_dotenv()
 
@@ -24,19 +53,195 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Embeddings of statute chunks already seen, so re-running setup on law_data only
+# pays for new or edited text. The file sits beside this module, wherever the
+# setup script is started from
+EMBEDDING_CACHE_PATH = os.getenv(
+    "LEGAL_EMBEDDING_CACHE", str(Path(__file__).parent / ".legal_embed_cache.db")
+)
+
+# Number of recent query embeddings kept by LegalRAGRetriever
+QUERY_EMBEDDING_CACHE_SIZE = 100
+
+# Opt-in: searches whose query embedding has cosine similarity >= the threshold to
+# a recent one reuse its results; up to SEARCH_CACHE_SIZE recent searches are kept.
+# Off by default, since distinct legal questions (another jurisdiction or statute,
+# "legal" vs "illegal") can be that similar; the chat API's response cache
+# handles near-repeats at a stricter threshold
+SEARCH_CACHE_ENABLED = os.getenv("LEGAL_SEARCH_CACHE", "0") == "1"
+SEARCH_CACHE_THRESHOLD = float(os.getenv("LEGAL_SEARCH_CACHE_THRESHOLD", "0.86"))
+SEARCH_CACHE_SIZE = 256
+
+# Chunk texts per embeddings request when building the legal knowledge base
+EMBEDDING_BATCH_SIZE = 256
+
+# Embedding batches in flight at once, and attempts per batch before splitting
+# it or falling back to per-item requests
+EMBEDDING_CONCURRENCY = 5
+EMBEDDING_MAX_RETRIES = 3
+
+# Each chat question scans the statute library once, from its own request; a
+# library of a few thousand chunks is done before extra threads would start, so
+# scans fan out to SIMILARITY_THREADS only from SIMILARITY_PARALLEL_ROWS rows up
+SIMILARITY_THREADS = os.cpu_count() or 1
+SIMILARITY_PARALLEL_ROWS = 100_000
+
+# Patterns and tables used by clean_text and chunk_text, built once
+PAGE_MARKER_RE = re.compile(r'\n--- Page \d+ ---\n')
+MERGED_WORDS_RE = re.compile(r'([a-z])([A-Z])')
+SECTION_NUMBER_RE = re.compile(r'(\w)(\d+\.\d+)')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+QUOTE_TABLE = str.maketrans({'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'"})
+
+# Processes extracting different PDFs at once in process_legal_documents
+DOCUMENT_WORKERS = 8
+
+# PDFs with more pages than this are extracted in parallel worker processes
+PARALLEL_EXTRACT_MIN_PAGES = 10
+
+# Shortlist of the int8 scan that is rescored with exact float32 similarities
+INT8_SHORTLIST = 32
+
+# Knowledge bases with at least this many chunks are searched through a faiss HNSW
+# graph; smaller ones are scanned exactly, which is what IndexFlatIP would do
+HNSW_MIN_CHUNKS = 100_000
+
+# Neighbors per HNSW node, and candidates explored per query
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+# Model used for embeddings, and for counting chunk tokens
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+@lru_cache(maxsize=None)
+def token_encoder(model: str = EMBEDDING_MODEL):
+    """Shared tiktoken encoding for the given embedding model."""
+    return tiktoken.encoding_for_model(model)
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token counts of texts, estimated from length when tiktoken is missing."""
+    if tiktoken is None:
+        return [len(text) // 4 + 1 for text in texts]  # ~4 characters per token
+    return [len(tokens) for tokens in token_encoder().encode_batch(texts, disallowed_special=())]
+
+def truncate_tokens(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Cut text to at most max_tokens tokens; returns the text and its token count."""
+    if tiktoken is None:
+        return text[:max_tokens * 4], min(len(text) // 4 + 1, max_tokens)
+    tokens = token_encoder().encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return token_encoder().decode(tokens[:max_tokens]), max_tokens
+
+def similarity_threads(rows: int) -> int:
+    """simsimd thread count for one question scored against `rows` chunks."""
+    return SIMILARITY_THREADS if rows >= SIMILARITY_PARALLEL_ROWS else 1
+
+def embeddings_path(pickle_path: str) -> Path:
+    """Path of the legal knowledge base's embedding matrix, next to its pickle."""
+    return Path(pickle_path).with_suffix('.embeddings.npy')
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit L2 norm as contiguous float32; zero rows stay zero."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row int8 codes, with each row's largest magnitude mapped to 127, and the row scales."""
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales).astype(np.int8)
+    return codes, scales.ravel().astype(np.float32)
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Marked text of pages [start, stop) of a PDF via PDFium; runs in worker processes."""
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        pages = []
+        for page_num in range(start, stop):
+            page = pdf[page_num]
+            textpage = page.get_textpage()
+            page_text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+            if page_text:
+                pages.append(f"\n--- Page {page_num + 1} ---\n{page_text}\n")
+            else:
+                logger.warning(f"No text found on page {page_num + 1}")
+        return pages
+    finally:
+        pdf.close()
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying an API call: Retry-After if given, else jittered backoff."""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            return float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            pass
+    # Jitter keeps concurrent batches from retrying in lockstep
+    return 2 ** attempt + random.random()
+
+class EmbeddingCache:
+    """SQLite table of legal chunk embeddings, addressed by a hash of model name and chunk text."""
+    
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        # Callers may embed from worker threads, so the shared connection is only
+        # used while holding the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB NOT NULL)')
+    
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{text}".encode()).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Vectors stored under any of keys; keys never embedded are left out."""
+        found = {}
+        with self.lock:
+            # 500 keys per statement keeps well below SQLite's host-parameter cap
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return found
+    
+    def put_many(self, items: List[Tuple[bytes, List[float]]]):
+        """Persist new vectors; all-zero placeholders from failed requests are not kept."""
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items if any(vec)
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)', rows)
+
 class LegalDocumentProcessor:
     """Process legal documents and create embeddings for RAG system."""
     
     def __init__(self, openai_api_key: str = None):
         """Initialize the processor with OpenAI client."""
-        self.openai_client = openai.OpenAI(
-            api_key=openai_api_key or os.getenv("OPENAI_API_KEY")
-        )
-        self.embedding_model = "text-embedding-3-small"
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.openai_client = openai.OpenAI(api_key=self.openai_api_key)
+        self.embedding_model = EMBEDDING_MODEL
         self.embedding_dimension = 1536
+        self.embedding_cache = EmbeddingCache()
+        
+    @staticmethod
+    def extract_text_from_pdf(pdf_path: str, parallel_pages: bool = True) -> str:
+        """Extract text content from a PDF file, using PDFium when available."""
+        if pdfium is not None:
+            try:
+                return LegalDocumentProcessor._extract_text_pdfium(pdf_path, parallel_pages)
+            except Exception as e:
+                # Any failure falls back; if PyPDF2 cannot read the file either, the
+                # result is "" rather than an error that aborts a whole batch
+                logger.warning(f"PDFium could not read {pdf_path}, falling back to PyPDF2: {e}")
         
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text content from a PDF file."""
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
@@ -63,36 +268,69 @@ class LegalDocumentProcessor:
             logger.error(f"Error reading PDF {pdf_path}: {e}")
             return ""
     
-    def clean_text(self, text: str) -> str:
+    @staticmethod
+    def _extract_text_pdfium(pdf_path: str, parallel_pages: bool = True) -> str:
+        """
+        Extract text with PDFium, keeping the same page markers as the PyPDF2 path.
+        
+        With parallel_pages, PDFs longer than PARALLEL_EXTRACT_MIN_PAGES are split into
+        page ranges extracted in worker processes; shorter ones are not worth the pool
+        startup.
+        """
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page_count = len(pdf)
+        finally:
+            pdf.close()
+        logger.info(f"PDF has {page_count} pages")
+        
+        workers = min(os.cpu_count() or 1, page_count)
+        if not parallel_pages or page_count <= PARALLEL_EXTRACT_MIN_PAGES or workers < 2:
+            pages = extract_page_range(pdf_path, 0, page_count)
+        else:
+            step = -(-page_count // workers)
+            starts = range(0, page_count, step)
+            with ProcessPoolExecutor(workers) as pool:
+                ranges = pool.map(
+                    extract_page_range, repeat(pdf_path), starts,
+                    [min(start + step, page_count) for start in starts]
+                )
+                pages = [page for page_range in ranges for page in page_range]
+        
+        text = "".join(pages)
+        if not text.strip():
+            logger.error(f"No text extracted from {pdf_path}")
+        return text
+    
+    @staticmethod
+    def clean_text(text: str) -> str:
         """Clean and normalize extracted text."""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        # Remove page markers but keep section info; done before whitespace is
+        # collapsed, since the pattern needs the newlines around the marker
+        text = PAGE_MARKER_RE.sub('\n', text)
         
-        # Remove page markers but keep section info
-        text = re.sub(r'\n--- Page \d+ ---\n', '\n', text)
+        # Normalize curly quotes in one translate pass
+        text = text.translate(QUOTE_TABLE)
         
-        # Fix common PDF extraction issues
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)  # Split merged words
-        text = re.sub(r'(\w)(\d+\.\d+)', r'\1 \2', text)  # Separate text from section numbers
+        # Collapse whitespace runs; split() with no argument already splits on
+        # every Unicode space, so no regex is needed
+        text = ' '.join(text.split())
         
-        # Normalize quotes
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
+        # Fix common PDF extraction issues
+        text = MERGED_WORDS_RE.sub(r'\1 \2', text)  # Split merged words
+        text = SECTION_NUMBER_RE.sub(r'\1 \2', text)  # Separate text from section numbers
         
         return text.strip()
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
+    @staticmethod
+    def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
         """Split text into overlapping chunks for better retrieval."""
         chunks = []
-        # Split into sentences more safely
-        try:
-            sentences = re.split(r'(?<=[.!?])\s+', text)
-        except re.error:
-            # Fallback to simpler splitting if regex fails
-            sentences = text.split('. ')
-            sentences = [s + '.' for s in sentences[:-1]] + [sentences[-1]]
+        sentences = SENTENCE_SPLIT_RE.split(text)
         
-        current_chunk = ""
+        # Sentences of the current chunk, joined only when it is emitted, and the
+        # length of that joined text
+        current_parts: List[str] = []
         current_size = 0
         chunk_index = 0
         
@@ -100,87 +338,211 @@ class LegalDocumentProcessor:
             sentence_size = len(sentence)
             
             # If adding this sentence would exceed chunk size, save current chunk
-            if current_size + sentence_size > chunk_size and current_chunk:
+            if current_size + 1 + sentence_size > chunk_size and current_parts:
                 chunks.append({
                     'index': chunk_index,
-                    'text': current_chunk.strip(),
+                    'text': " ".join(current_parts).strip(),
                     'size': current_size,
                     'start_sentence': chunk_index * (chunk_size - overlap) // 100  # Approximate
                 })
                 
                 # Start new chunk with overlap
-                overlap_text = self._get_overlap_text(current_chunk, overlap)
-                current_chunk = overlap_text + " " + sentence
-                current_size = len(current_chunk)
+                current_parts = LegalDocumentProcessor._get_overlap_parts(current_parts, overlap)
+                current_size = (
+                    sum(map(len, current_parts)) + len(current_parts) - 1 if current_parts else 0
+                )
                 chunk_index += 1
-            else:
-                current_chunk += " " + sentence if current_chunk else sentence
-                current_size += sentence_size
+            
+            current_size += sentence_size + 1 if current_parts else sentence_size
+            current_parts.append(sentence)
         
         # Add final chunk
-        if current_chunk:
+        final_text = " ".join(current_parts).strip()
+        if final_text:
             chunks.append({
                 'index': chunk_index,
-                'text': current_chunk.strip(),
+                'text': final_text,
                 'size': current_size,
                 'start_sentence': chunk_index * (chunk_size - overlap) // 100
             })
         
         return chunks
     
-    def _get_overlap_text(self, text: str, overlap_size: int) -> str:
-        """Get the last portion of text for overlap."""
-        if len(text) <= overlap_size:
-            return text
-        
-        # Try to break at sentence boundary
-        overlap_text = text[-overlap_size:]
-        sentence_start = overlap_text.find('. ')
-        
-        if sentence_start > 0:
-            return overlap_text[sentence_start + 2:]
-        
-        return overlap_text
+    @staticmethod
+    def _get_overlap_parts(parts: List[str], overlap_size: int) -> List[str]:
+        """Trailing whole sentences of a chunk that fit in overlap_size characters."""
+        kept: List[str] = []
+        total = -1  # no separator before the first kept sentence
+        for part in reversed(parts):
+            total += len(part) + 1
+            if total > overlap_size:
+                break
+            kept.append(part)
+        
+        # A final sentence longer than the overlap contributes its tail instead,
+        # without the leading whitespace the emitted chunk text would strip
+        if not kept and parts and overlap_size > 0:
+            tail = parts[-1][-overlap_size:].lstrip()
+            return [tail] if tail else []
+        kept.reverse()
+        return kept
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a piece of text."""
+        key = EmbeddingCache.key(self.embedding_model, text)
+        cached = self.embedding_cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        
         try:
             response = self.openai_client.embeddings.create(
                 model=self.embedding_model,
                 input=text,
                 encoding_format="float"
             )
+            embedding = response.data[0].embedding
+            self.embedding_cache.put_many([(key, embedding)])
+            return embedding
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            return [0.0] * self.embedding_dimension
+    
+    def generate_embeddings_batch(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+        """Synchronous wrapper over agenerate_embeddings_batch for single-document use."""
+        return asyncio.run(self.agenerate_embeddings_batch(texts, batch_size))
+    
+    async def agenerate_embeddings_batch(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+                                         client: openai.AsyncOpenAI = None,
+                                         semaphore: asyncio.Semaphore = None) -> List[List[float]]:
+        """
+        Embed chunk texts in batches of batch_size, EMBEDDING_CONCURRENCY requests at a time.
+        
+        aprocess_documents hands every document the same client and semaphore, so the
+        request limit covers the whole law_data directory rather than each PDF.
+        """
+        # Chunks embedded by an earlier setup run are read back instead of re-requested
+        keys = [EmbeddingCache.key(self.embedding_model, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        embeddings = [cached.get(key) for key in keys]
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        logger.info(f"Embedding cache: {len(texts) - len(misses)} hits, {len(misses)} misses")
+        if not misses:
+            return embeddings
+        
+        # Without a shared client, a fresh one per run, since its connection pool is
+        # bound to the event loop
+        owned = openai.AsyncOpenAI(api_key=self.openai_api_key) if client is None else None
+        async with owned or nullcontext(client) as client:
+            semaphore = semaphore or asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+            batches = [misses[start:start + batch_size] for start in range(0, len(misses), batch_size)]
+            results = await asyncio.gather(
+                *(self._aembed_batch(client, [texts[i] for i in batch], semaphore) for batch in batches)
+            )
+        
+        for batch, batch_embeddings in zip(batches, results):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        
+        self.embedding_cache.put_many([(keys[i], embeddings[i]) for i in misses])
+        return embeddings
+    
+    async def _aembed_batch(self, client: openai.AsyncOpenAI, batch: List[str],
+                            semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """
+        Embed one batch, halving it when the request is too large for the API and
+        backing off on rate limits and transient errors.
+        """
+        rejected = False
+        async with semaphore:
+            for attempt in range(EMBEDDING_MAX_RETRIES):
+                try:
+                    response = await client.embeddings.create(
+                        model=self.embedding_model,
+                        input=batch,
+                        encoding_format="float"
+                    )
+                    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+                except openai.BadRequestError as e:
+                    # Usually the batch exceeds the per-request token limit; retrying will not help
+                    logger.warning(f"Embedding batch of {len(batch)} rejected: {e}")
+                    rejected = True
+                    break
+                except openai.APIError as e:
+                    logger.warning(f"Embedding batch failed (attempt {attempt + 1}): {e}")
+                    if attempt + 1 < EMBEDDING_MAX_RETRIES:
+                        await asyncio.sleep(retry_delay(e, attempt))
+        
+        # Split outside the semaphore so the halves can take their own slots
+        if rejected and len(batch) > 1:
+            half = len(batch) // 2
+            first, second = await asyncio.gather(
+                self._aembed_batch(client, batch[:half], semaphore),
+                self._aembed_batch(client, batch[half:], semaphore),
+            )
+            return first + second
+        
+        # Embed item by item, so a single malformed chunk only loses its own vector
+        return [await self._aembed_one(client, text) for text in batch]
+    
+    async def _aembed_one(self, client: openai.AsyncOpenAI, text: str) -> List[float]:
+        """Embed one chunk on the async client; a zero vector stands in if the request fails."""
+        try:
+            response = await client.embeddings.create(
+                model=self.embedding_model,
+                input=text,
+                encoding_format="float"
+            )
             return response.data[0].embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return [0.0] * self.embedding_dimension
     
-    def process_document(self, pdf_path: str, document_name: str = None) -> Dict[str, Any]:
-        """Process a single PDF document."""
+    @staticmethod
+    def prepare_document(pdf_path: str, document_name: str = None,
+                         parallel_pages: bool = True) -> Dict[str, Any]:
+        """
+        Extract, clean and chunk a legal PDF.
+        
+        Nothing here touches the OpenAI client, which is what lets aprocess_documents
+        run it away from the event loop, in a pool worker or a thread.
+        """
         if document_name is None:
             document_name = Path(pdf_path).stem
         
         logger.info(f"Processing document: {document_name}")
         
         # Extract text
-        raw_text = self.extract_text_from_pdf(pdf_path)
+        raw_text = LegalDocumentProcessor.extract_text_from_pdf(pdf_path, parallel_pages)
         if not raw_text:
             logger.error(f"No text extracted from {pdf_path}")
             return None
         
         # Clean text
-        clean_text = self.clean_text(raw_text)
+        clean_text = LegalDocumentProcessor.clean_text(raw_text)
         
         # Create chunks
-        chunks = self.chunk_text(clean_text)
+        chunks = LegalDocumentProcessor.chunk_text(clean_text)
         logger.info(f"Created {len(chunks)} chunks for {document_name}")
         
-        # Generate embeddings for each chunk
+        return {
+            'document_name': document_name,
+            'document_path': pdf_path,
+            'chunks': chunks,
+            'original_text_length': len(raw_text),
+            'clean_text_length': len(clean_text)
+        }
+    
+    def build_document(self, prepared: Dict[str, Any], embeddings: List[List[float]]) -> Dict[str, Any]:
+        """Attach chunk embeddings to prepare_document output, giving the stored document dict."""
+        document_name = prepared['document_name']
+        pdf_path = prepared['document_path']
+        chunks = prepared['chunks']
+        
+        # Token counts let the chat API budget context without re-tokenizing
+        token_counts = count_tokens([chunk['text'] for chunk in chunks])
+        
         processed_chunks = []
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Generating embedding for chunk {i+1}/{len(chunks)}")
-            embedding = self.generate_embedding(chunk['text'])
-            
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
             processed_chunks.append({
                 'chunk_id': f"{document_name}_chunk_{chunk['index']}",
                 'document_name': document_name,
@@ -190,7 +552,8 @@ class LegalDocumentProcessor:
                     'chunk_index': chunk['index'],
                     'size': chunk['size'],
                     'document_path': pdf_path,
-                    'start_sentence': chunk.get('start_sentence', 0)
+                    'start_sentence': chunk.get('start_sentence', 0),
+                    'token_count': token_counts[i]
                 }
             })
         
@@ -200,12 +563,60 @@ class LegalDocumentProcessor:
             'total_chunks': len(processed_chunks),
             'chunks': processed_chunks,
             'metadata': {
-                'original_text_length': len(raw_text),
-                'clean_text_length': len(clean_text),
+                'original_text_length': prepared['original_text_length'],
+                'clean_text_length': prepared['clean_text_length'],
                 'embedding_model': self.embedding_model
             }
         }
     
+    def process_document(self, pdf_path: str, document_name: str = None) -> Dict[str, Any]:
+        """Process a single PDF document."""
+        prepared = self.prepare_document(pdf_path, document_name)
+        if prepared is None:
+            return None
+        
+        # One embeddings request per batch of this document's chunks
+        embeddings = self.generate_embeddings_batch([chunk['text'] for chunk in prepared['chunks']])
+        return self.build_document(prepared, embeddings)
+    
+    async def aprocess_documents(self, pdf_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Build documents for a set of legal PDFs, embedding each statute's chunks as soon
+        as its text is ready instead of after the whole directory has been extracted.
+        All embedding requests go through one client under one EMBEDDING_CONCURRENCY limit.
+        
+        Several documents are extracted in a pool of up to DOCUMENT_WORKERS processes, one
+        document per worker, since PDFium is not thread-safe. A single document is prepared
+        on a thread of this process instead, so its pages can be extracted in parallel
+        without starting a pool inside a pool worker. The API client stays in this
+        process. Documents are returned in input order.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        workers = max(1, min(DOCUMENT_WORKERS, os.cpu_count() or 1, len(pdf_paths)))
+        single = len(pdf_paths) == 1
+        
+        async with openai.AsyncOpenAI(api_key=self.openai_api_key) as client:
+            with nullcontext() if single else ProcessPoolExecutor(workers) as pool:
+                async def process(pdf_path: str) -> Dict[str, Any]:
+                    if single:
+                        prepared = await asyncio.to_thread(self.prepare_document, pdf_path)
+                    else:
+                        prepared = await loop.run_in_executor(
+                            pool, partial(self.prepare_document, pdf_path, parallel_pages=False)
+                        )
+                    if prepared is None:
+                        return None
+                    embeddings = await self.agenerate_embeddings_batch(
+                        [chunk['text'] for chunk in prepared['chunks']],
+                        client=client, semaphore=semaphore
+                    )
+                    return self.build_document(prepared, embeddings)
+                
+                documents = await asyncio.gather(*(process(pdf_path) for pdf_path in pdf_paths))
+        
+        return [document for document in documents if document]
+    
     def process_legal_documents(self, law_data_dir: str) -> Dict[str, Any]:
         """Process all PDF documents in the law_data directory."""
         law_data_path = Path(law_data_dir)
@@ -219,14 +630,11 @@ class LegalDocumentProcessor:
         
         logger.info(f"Found {len(pdf_files)} PDF files to process")
         
-        all_documents = []
+        all_documents = asyncio.run(self.aprocess_documents([str(f) for f in pdf_files]))
         all_chunks = []
         
-        for pdf_file in pdf_files:
-            document_data = self.process_document(str(pdf_file))
-            if document_data:
-                all_documents.append(document_data)
-                all_chunks.extend(document_data['chunks'])
+        for document_data in all_documents:
+            all_chunks.extend(document_data['chunks'])
         
         legal_knowledge_base = {
             'documents': all_documents,
@@ -243,10 +651,36 @@ class LegalDocumentProcessor:
         return legal_knowledge_base
     
     def save_to_pickle(self, data: Dict[str, Any], pickle_path: str):
-        """Save processed data to pickle file."""
+        """
+        Save processed data to pickle file.
+        
+        Chunk embeddings are written unit-length to an .npy file next to the pickle, which
+        LegalRAGRetriever memory-maps instead of unpickling a Python float per dimension.
+        """
         try:
+            chunks = data['all_chunks']
+            if chunks and 'embedding' in chunks[0]:
+                embeddings = normalize_rows(np.array([chunk['embedding'] for chunk in chunks], dtype=np.float32))
+                
+                # Each statute's chunk list holds the same dicts as all_chunks, so strip
+                # every chunk once and point both lists at the stripped copy
+                stripped = {
+                    id(chunk): {k: v for k, v in chunk.items() if k != 'embedding'}
+                    for chunk in chunks
+                }
+                data = {
+                    **data,
+                    'documents': [
+                        {**doc, 'chunks': [stripped.get(id(c), c) for c in doc.get('chunks', [])]}
+                        for doc in data.get('documents', [])
+                    ],
+                    'all_chunks': [stripped[id(chunk)] for chunk in chunks],
+                    'metadata': {**data['metadata'], 'embeddings_normalized': True},
+                }
+                np.save(embeddings_path(pickle_path), embeddings)
+            
             with open(pickle_path, 'wb') as f:
-                pickle.dump(data, f)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
             logger.info(f"Legal knowledge base saved to {pickle_path}")
         except Exception as e:
             logger.error(f"Error saving to pickle: {e}")
@@ -258,16 +692,89 @@ class LegalRAGRetriever:
     def __init__(self, pickle_path: str):
         """Initialize retriever with pickled knowledge base."""
         self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.embedding_model = "text-embedding-3-small"
+        self.embedding_model = EMBEDDING_MODEL
         
         with open(pickle_path, 'rb') as f:
             self.knowledge_base = pickle.load(f)
         
         self.chunks = self.knowledge_base['all_chunks']
-        self.embeddings = np.array([chunk['embedding'] for chunk in self.chunks])
+        # Unit-length rows, so cosine similarity is a single matrix-vector product
+        self.embeddings = self._load_embeddings(pickle_path)
+        # int8 codes for the SimSIMD prefilter scan, a quarter of the float32 bytes
+        self.embeddings_i8, self.embedding_scales = (
+            quantize_int8(self.embeddings) if simsimd is not None and self.chunks else (None, None)
+        )
+        
+        self.ann_index = self._build_ann_index(pickle_path)
+        
+        # LRU of query text -> embedding, shared by every caller of embed()
+        self._query_embeddings: OrderedDict = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+        
+        # Recent searches: unit-length query vectors in fixed rows of one matrix, so a
+        # lookup is a single matrix-vector product, and an LRU of row -> (top_k, results)
+        self._search_vectors = (
+            np.zeros((SEARCH_CACHE_SIZE, self.embeddings.shape[1]), dtype=np.float32)
+            if SEARCH_CACHE_ENABLED and self.chunks else None
+        )
+        self._search_results: OrderedDict = OrderedDict()
+        self._search_lock = threading.Lock()
         
         logger.info(f"Loaded knowledge base with {len(self.chunks)} chunks")
     
+    def _load_embeddings(self, pickle_path: str) -> np.ndarray:
+        """
+        Load the unit-length chunk embedding matrix.
+        
+        Knowledge bases written by save_to_pickle keep it in an .npy file next to the
+        pickle, which is memory-mapped so workers loading the same file share its pages.
+        Older pickles store embeddings inline per chunk and are normalized in memory.
+        """
+        if not self.chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        if 'embedding' in self.chunks[0]:
+            return normalize_rows([chunk['embedding'] for chunk in self.chunks])
+        
+        npy_path = embeddings_path(pickle_path)
+        embeddings = np.load(npy_path, mmap_mode='r')
+        if embeddings.shape[0] != len(self.chunks) or embeddings.dtype != np.float32:
+            raise ValueError(f"Embedding file {npy_path} does not match the knowledge base")
+        if not self.knowledge_base['metadata'].get('embeddings_normalized', False):
+            embeddings = normalize_rows(embeddings)
+        return embeddings
+    
+    def _build_ann_index(self, pickle_path: str):
+        """
+        Build an HNSW index over the embeddings of large knowledge bases.
+        
+        The index is saved next to the knowledge base and reused until the pickle
+        changes, since building the graph dominates load time.
+        """
+        if faiss is None or len(self.chunks) < HNSW_MIN_CHUNKS:
+            return None
+        
+        index_path = Path(pickle_path).with_suffix('.faiss')
+        if index_path.exists() and index_path.stat().st_mtime >= Path(pickle_path).stat().st_mtime:
+            try:
+                index = faiss.read_index(str(index_path))
+                if index.ntotal == len(self.chunks) and index.d == self.embeddings.shape[1]:
+                    index.hnsw.efSearch = HNSW_EF_SEARCH
+                    return index
+            except RuntimeError as e:
+                logger.warning(f"Could not read ANN index {index_path}: {e}")
+        
+        # Rows are already unit length, so inner product is cosine similarity
+        index = faiss.IndexHNSWFlat(self.embeddings.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.add(np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        
+        try:
+            faiss.write_index(index, str(index_path))
+        except RuntimeError as e:
+            logger.warning(f"Could not write ANN index {index_path}: {e}")
+        return index
+    
     def generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for search query."""
         response = self.openai_client.embeddings.create(
@@ -277,27 +784,127 @@ class LegalRAGRetriever:
         )
         return response.data[0].embedding
     
-    def search_similar_chunks(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Find most similar chunks to the query."""
-        query_embedding = np.array(self.generate_query_embedding(query)).reshape(1, -1)
-        
-        # Calculate cosine similarities
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-        
-        # Get top-k most similar chunks
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+    def embed(self, query: str) -> np.ndarray:
+        """Return the query embedding, reusing it for recently embedded text."""
+        with self._query_embeddings_lock:
+            vector = self._query_embeddings.get(query)
+            if vector is not None:
+                self._query_embeddings.move_to_end(query)
+                return vector
+        
+        vector = np.asarray(self.generate_query_embedding(query), dtype=np.float32)
+        with self._query_embeddings_lock:
+            self._query_embeddings[query] = vector
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return vector
+    
+    def search_similar_chunks(self, query: str, top_k: int = 5,
+                              query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """Find most similar chunks to the query; a precomputed query_embedding skips the API call."""
+        if query_embedding is None:
+            query_embedding = self.embed(query)
+        return self.search_similar_chunks_by_vector(query_embedding, top_k=top_k)
+    
+    def _similarities(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Inner products of a unit-length query with every chunk, or a subset of rows."""
+        corpus = self.embeddings if rows is None else self.embeddings[rows]
+        if simsimd is not None and len(corpus):
+            return np.asarray(simsimd.cdist(
+                query.reshape(1, -1), corpus, metric="dot", threads=similarity_threads(len(corpus))
+            ))[0]
+        return corpus @ query
+    
+    def _int8_similarities(self, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products against the int8-quantized corpus."""
+        query_codes, query_scale = quantize_int8(query.reshape(1, -1))
+        dots = np.asarray(simsimd.cdist(
+            query_codes, self.embeddings_i8, metric="dot",
+            threads=similarity_threads(len(self.embeddings_i8))
+        ))[0]
+        return dots * query_scale[0] * self.embedding_scales
+    
+    def _cached_search(self, query: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """Results of a recent search close enough to a unit-length query, if any."""
+        with self._search_lock:
+            if not self._search_results:
+                return None
+            scores = self._search_vectors @ query
+            # Rows not in use are zero and never reach the threshold
+            for row in np.argsort(-scores).tolist():
+                if scores[row] < SEARCH_CACHE_THRESHOLD:
+                    return None
+                cached_k, results = self._search_results.get(row, (0, None))
+                if cached_k >= top_k:
+                    self._search_results.move_to_end(row)
+                    return results[:top_k]
+        return None
+    
+    def _store_search(self, query: np.ndarray, top_k: int, results: List[Dict[str, Any]]):
+        """Remember a search, evicting the least recently used one when full."""
+        with self._search_lock:
+            if len(self._search_results) < SEARCH_CACHE_SIZE:
+                row = len(self._search_results)
+            else:
+                row, _ = self._search_results.popitem(last=False)
+            self._search_vectors[row] = query
+            self._search_results[row] = (top_k, results)
+    
+    def search_similar_chunks_by_vector(self, query_embedding, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the chunks most similar to an already computed query embedding.
+        
+        With LEGAL_SEARCH_CACHE=1, near-repeat queries are answered from the results
+        of a recent search without scanning the corpus.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        query = query / max(np.sqrt(np.vdot(query, query)), 1e-12)
+        
+        cacheable = self._search_vectors is not None and len(query) == self._search_vectors.shape[1]
+        if cacheable:
+            cached = self._cached_search(query, top_k)
+            if cached is not None:
+                return cached
+        
+        # Calculate cosine similarities; rows are unit length, so an inner product
+        if self.ann_index is not None:
+            # HNSW search visits a small part of the graph and returns ranked results
+            k = min(max(HNSW_EF_SEARCH, top_k), len(self.chunks))
+            similarities, candidates = self.ann_index.search(query.reshape(1, -1), k)
+            found = candidates[0] >= 0
+            candidates, similarities = candidates[0][found], similarities[0][found]
+        elif self.embeddings_i8 is not None and len(self.chunks) > INT8_SHORTLIST:
+            # Shortlist with the int8 scan, then rescore it exactly in float32
+            scores = self._int8_similarities(query)
+            k = min(max(INT8_SHORTLIST, top_k), len(scores))
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            similarities = self._similarities(query, candidates)
+        else:
+            candidates = np.arange(len(self.chunks))
+            similarities = self._similarities(query)
+        
+        # Get top-k most similar chunks: partition in O(N), then sort only those k
+        k = min(top_k, len(similarities))
+        if k <= 0:
+            return []
+        top_positions = np.argpartition(-similarities, k - 1)[:k]
+        top_positions = top_positions[np.argsort(-similarities[top_positions], kind='stable')]
+        top_indices = candidates[top_positions]
+        similarities = similarities[top_positions]
         
         results = []
-        for idx in top_indices:
+        for idx, similarity in zip(top_indices, similarities):
             chunk = self.chunks[idx]
             results.append({
                 'text': chunk['text'],
-                'similarity': float(similarities[idx]),
+                'similarity': float(similarity),
                 'document_name': chunk['document_name'],
                 'chunk_id': chunk['chunk_id'],
                 'metadata': chunk['metadata']
             })
         
+        if cacheable:
+            self._store_search(query, top_k, results)
         return results
 
 def main():